@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import crime_predictor
+import crime_store
+import dashboard_data
+import train_model
+
+# ========================================================
+# OFFLINE BENCHMARK SUITE                                |
+# ========================================================
+#
+# Generates a synthetic crime CSV with the layout of the LAPD rows.csv export
+# (same columns, value formats, area names, crime descriptions and a skewed
+# crime mix), then runs every stage behind the dashboard on it without
+# Streamlit or network access: CSV ingest into the store, the count cube,
+# the Trend / Temporal / Geographic panel data, row-level date-range reads,
+# model training on a sample, batch prediction and the prediction table.
+# Each stage reports wall time, peak memory and rows per second as JSON;
+# comparing against a saved baseline flags stages that got slower.
+#
+# Peak memory is the process's peak resident set size during the stage
+# (Linux, reset between stages through /proc/self/clear_refs), which also
+# counts Arrow and other native buffers. Elsewhere it falls back to
+# tracemalloc, which only sees Python/NumPy allocations and slows stages down.
+#
+#     python benchmark.py                                  # 100k and 1M rows
+#     python benchmark.py --rows 10000000 --workdir /data/bench
+#     python benchmark.py --save-baseline benchmarks/baseline.json
+#     python benchmark.py --baseline benchmarks/baseline.json --output run.json
+
+DEFAULT_ROWS = [100_000, 1_000_000]
+GENERATE_CHUNK = 250_000
+TRAIN_SAMPLE = 20_000
+PREDICT_BATCH = 10_000
+
+# Stages faster than this are too noisy to flag against a baseline
+MIN_COMPARE_SECONDS = 0.05
+
+# LAPD geographic areas by AREA code, with a rough centre for the synthetic LAT/LON
+AREAS = {
+    1: ('Central', 34.046, -118.249), 2: ('Rampart', 34.063, -118.275), 3: ('Southwest', 34.017, -118.300),
+    4: ('Hollenbeck', 34.045, -118.207), 5: ('Harbor', 33.766, -118.284), 6: ('Hollywood', 34.100, -118.330),
+    7: ('Wilshire', 34.061, -118.350), 8: ('West LA', 34.045, -118.440), 9: ('Van Nuys', 34.186, -118.448),
+    10: ('West Valley', 34.193, -118.538), 11: ('Northeast', 34.118, -118.240), 12: ('77th Street', 33.970, -118.295),
+    13: ('Newton', 34.010, -118.260), 14: ('Pacific', 33.980, -118.420), 15: ('N Hollywood', 34.175, -118.385),
+    16: ('Foothill', 34.253, -118.410), 17: ('Devonshire', 34.257, -118.530), 18: ('Southeast', 33.938, -118.265),
+    19: ('Mission', 34.272, -118.455), 20: ('Olympic', 34.052, -118.300), 21: ('Topanga', 34.200, -118.600),
+}
+PREMISES = {101: 'STREET', 501: 'SINGLE FAMILY DWELLING', 502: 'MULTI-UNIT DWELLING (APARTMENT, DUPLEX, ETC)',
+            108: 'PARKING LOT', 203: 'OTHER BUSINESS', 102: 'SIDEWALK', 210: 'RESTAURANT/FAST FOOD',
+            122: 'VEHICLE, PASSENGER/TRUCK', 404: 'DEPARTMENT STORE', 128: 'BUS STOP/LAYOVER (ALSO QUERY 124)'}
+WEAPONS = {400: 'STRONG-ARM (HANDS, FIST, FEET OR BODILY FORCE)', 500: 'UNKNOWN WEAPON/OTHER WEAPON',
+           511: 'VERBAL THREAT', 102: 'HAND GUN', 200: 'KNIFE WITH BLADE 6INCHES OR LESS'}
+STATUSES = {'IC': 'Invest Cont', 'AO': 'Adult Other', 'AA': 'Adult Arrest', 'JA': 'Juv Arrest', 'JO': 'Juv Other'}
+STREETS = ['MAIN', 'BROADWAY', 'FIGUEROA', 'VERMONT', 'WESTERN', 'SUNSET', 'OLYMPIC', 'PICO', 'VENTURA', 'SEPULVEDA']
+MOCODES = ['0344', '1822 0344', '0416 0400', '1300 0344', '0913 1814 2000', '0325 1501', '']
+
+DATE_START = pd.Timestamp('2020-01-01')
+DATE_END = pd.Timestamp('2024-05-20')
+
+
+def _skewed_index(rng, k, n, skew=1.0):
+    # Zipf-like weights so a few values dominate, as in the real export
+    weights = 1.0 / np.arange(1, k + 1) ** skew
+    return rng.choice(k, size=n, p=weights / weights.sum())
+
+
+def _pick(rng, values, n, skew=1.0):
+    return np.asarray(values, dtype=object)[_skewed_index(rng, len(values), n, skew)]
+
+
+def _blank(rng, values, share):
+    values = values.astype(object)
+    values[rng.random(len(values)) < share] = ''
+    return values
+
+
+def synthetic_chunk(rng, first_dr_no, n):
+    """n rows of text in the rows.csv layout (EXPORT_COLUMNS), like iter_csv_chunks reads them."""
+    n_days = (DATE_END - DATE_START).days + 1
+    day_labels = pd.date_range(DATE_START, DATE_END, freq='D').strftime('%m/%d/%Y 12:00:00 AM').to_numpy()
+    occurred = rng.integers(0, n_days, n)
+    reported = np.minimum(occurred + rng.geometric(0.3, n) - 1, n_days - 1)
+
+    hour_weights = np.array([4, 3, 2, 2, 1, 1, 2, 3, 4, 5, 5, 5, 8, 6, 6, 6, 7, 7, 8, 7, 7, 6, 5, 4], dtype=float)
+    hour = rng.choice(24, size=n, p=hour_weights / hour_weights.sum())
+    minute = np.where(rng.random(n) < 0.5, 0, rng.integers(0, 60, n))
+
+    area = rng.integers(1, len(AREAS) + 1, n)
+    area_name = np.array([AREAS[a][0] for a in range(1, len(AREAS) + 1)], dtype=object)[area - 1]
+    centre = np.array([AREAS[a][1:] for a in range(1, len(AREAS) + 1)])[area - 1]
+    lat = np.round(centre[:, 0] + rng.normal(0, 0.02, n), 4)
+    lon = np.round(centre[:, 1] + rng.normal(0, 0.02, n), 4)
+    null_island = rng.random(n) < 0.002
+    lat[null_island] = 0
+    lon[null_island] = 0
+
+    crimes = list(train_model.CRIME_MAPPING)
+    crime_index = _skewed_index(rng, len(crimes), n)
+    crime_code = 110 + crime_index * 7
+    premis = _pick(rng, list(PREMISES), n)
+    weapon = _pick(rng, list(WEAPONS), n)
+    has_weapon = rng.random(n) < 0.35
+    status = _pick(rng, list(STATUSES), n, skew=2.0)
+
+    return pd.DataFrame({
+        'DR_NO': np.arange(first_dr_no, first_dr_no + n).astype(str),
+        'Date Rptd': day_labels[reported],
+        'DATE OCC': day_labels[occurred],
+        'TIME OCC': (hour * 100 + minute).astype(str),
+        'AREA': area.astype(str),
+        'AREA NAME': area_name,
+        'Rpt Dist No': (area * 100 + rng.integers(0, 100, n)).astype(str),
+        'Part 1-2': np.where(crime_index < 20, '1', '2'),
+        'Crm Cd': crime_code.astype(str),
+        'Crm Cd Desc': np.asarray(crimes, dtype=object)[crime_index],
+        'Mocodes': _pick(rng, MOCODES, n),
+        'Vict Age': rng.integers(0, 90, n).astype(str),
+        'Vict Sex': _blank(rng, _pick(rng, ['M', 'F', 'X'], n), 0.1),
+        'Vict Descent': _blank(rng, _pick(rng, ['H', 'W', 'B', 'O', 'X', 'A'], n), 0.1),
+        'Premis Cd': premis.astype(str),
+        'Premis Desc': np.array([PREMISES[p] for p in premis], dtype=object),
+        'Weapon Used Cd': np.where(has_weapon, weapon.astype(str), ''),
+        'Weapon Desc': np.where(has_weapon, np.array([WEAPONS[w] for w in weapon], dtype=object), ''),
+        'Status': status,
+        'Status Desc': np.array([STATUSES[s] for s in status], dtype=object),
+        'Crm Cd 1': crime_code.astype(str),
+        'Crm Cd 2': _blank(rng, np.full(n, '998', dtype=object), 0.9),
+        'Crm Cd 3': '',
+        'Crm Cd 4': '',
+        'LOCATION': (rng.integers(1, 200, n) * 100).astype(str).astype(object) + ' ' + _pick(rng, STREETS, n) + ' ST',
+        'Cross Street': _blank(rng, _pick(rng, STREETS, n), 0.85),
+        'LAT': lat.astype(str),
+        'LON': lon.astype(str),
+    }, columns=crime_store.EXPORT_COLUMNS)
+
+
+def generate_csv(path, n_rows, seed=42):
+    """Writes n_rows of synthetic records to path, chunk by chunk so 10M rows never sit in memory."""
+    rng = np.random.default_rng(seed)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        for start in range(0, n_rows, GENERATE_CHUNK):
+            chunk = synthetic_chunk(rng, 200000000 + start, min(GENERATE_CHUNK, n_rows - start))
+            chunk.to_csv(f, index=False, header=start == 0)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) * 1024
+
+
+def measure(func, rows, trace_memory=True):
+    """Runs func once; returns (result, stats)."""
+    rss = trace_memory and _reset_peak_rss()
+    if trace_memory and not rss:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = None
+    if rss:
+        peak = _peak_rss()
+    elif trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    rows = rows(result) if callable(rows) else rows
+    return result, {
+        'seconds': round(seconds, 4),
+        'rows': int(rows),
+        'rows_per_second': round(rows / seconds) if seconds > 0 else None,
+        'peak_mb': round(peak / 2 ** 20, 1) if peak is not None else None,
+    }
+
+
+def run_stages(csv_path, store_path, n_rows, seed=42, trace_memory=True):
+    """Every pipeline stage on one dataset, in dashboard order; returns {stage: stats}."""
+    stages = {}
+    rng = np.random.default_rng(seed)
+
+    def stage(name, func, rows=n_rows):
+        result, stages[name] = measure(func, rows, trace_memory)
+        return result
+
+    stage('build_store', lambda: crime_store.build_store(csv_path, store_path))
+    cube = stage('load_cube', lambda: crime_store.load_cube(csv_path, store_path))
+
+    # Panel data (what the Data page computes per rerun)
+    stage('trend', lambda: (dashboard_data.total_crime_data(cube),
+                            dashboard_data.filter_trend_data(cube, cube.crimes[0])))
+    year = cube.years()[len(cube.years()) // 2]
+    stage('temporal_year', lambda: dashboard_data.temporal_summary(cube, cube.year_slice(year)))
+    stage('temporal_range', lambda: dashboard_data.temporal_summary(
+        cube, cube.day_slice(cube.dates[0] + pd.Timedelta(days=90), cube.dates[0] + pd.Timedelta(days=455))))
+
+    # Row-level reads
+    stage('load_columns', lambda: crime_store.load_columns(train_model.TRAIN_COLUMNS, csv_path, store_path))
+    stage('time_index', lambda: crime_store.load_time_index(csv_path, store_path))
+    stage('date_range', lambda: crime_store.load_date_range(f'{year}-01-01', f'{year}-12-31',
+                                                            train_model.TRAIN_COLUMNS, csv_path, store_path),
+          rows=len)
+
+    # Geographic panel
+    spatial_index = stage('spatial_index', lambda: crime_store.load_spatial_index(csv_path, store_path))
+    stage('map_bins', lambda: dashboard_data.map_bins(spatial_index))
+    stage('map_bins_filtered', lambda: dashboard_data.map_bins(spatial_index, spatial_index.crimes[:5]))
+
+    # Model: a small sample keeps training time independent of the dataset size
+    def train():
+        data, _ = train_model.load_training_data(min(TRAIN_SAMPLE, n_rows), seed,
+                                                 csv_path=csv_path, store_path=store_path)
+        X, y = train_model.build_features(data)
+        model, _ = train_model.train(X, y, k_max=5, cv=2, resample=False, seed=seed)
+        return crime_predictor.CrimePredictor(model, X.columns)
+
+    predictor = stage('train_model', train, rows=min(TRAIN_SAMPLE, n_rows))
+    inputs = (np.array(predictor.areas, dtype=object)[rng.integers(0, len(predictor.areas), PREDICT_BATCH)],
+              rng.integers(0, 7, PREDICT_BATCH), rng.integers(0, 24, PREDICT_BATCH),
+              rng.integers(1, 13, PREDICT_BATCH), rng.integers(0, 2, PREDICT_BATCH))
+    stage('predict', lambda: predictor.predict(*inputs), rows=PREDICT_BATCH)
+    table = stage('prediction_table', lambda: crime_predictor.PredictionTable.build(predictor),
+                  rows=lambda table: table.top_classes[..., 0].size)
+    stage('table_lookup', lambda: table.predict(*inputs), rows=PREDICT_BATCH)
+    return stages
+
+
+def run(row_counts, workdir, seed=42, trace_memory=True):
+    results = {
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'runs': {},
+    }
+    for n_rows in row_counts:
+        # The generated CSV is reused between runs; the store is always rebuilt from it
+        csv_path = os.path.join(workdir, f'synthetic_{n_rows}.csv')
+        generate_seconds = None
+        if not os.path.exists(csv_path):
+            start = time.perf_counter()
+            generate_csv(csv_path, n_rows, seed)
+            generate_seconds = round(time.perf_counter() - start, 2)
+        store_dir = os.path.join(workdir, f'store_{n_rows}')
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+        stages = run_stages(csv_path, os.path.join(store_dir, 'crime_data.parquet'), n_rows, seed, trace_memory)
+        results['runs'][str(n_rows)] = {'generate_seconds': generate_seconds, 'stages': stages}
+        print(f'{n_rows:>12,} rows: ' + ', '.join(f"{name} {stats['seconds']:.3f}s" for name, stats in stages.items()),
+              file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Lists stages whose wall time grew more than tolerance over the baseline run of the same size."""
+    regressions = []
+    for n_rows, run_results in results['runs'].items():
+        base_stages = baseline.get('runs', {}).get(n_rows, {}).get('stages', {})
+        for name, stats in run_results['stages'].items():
+            base = base_stages.get(name)
+            if base is None or base['seconds'] < MIN_COMPARE_SECONDS:
+                continue
+            ratio = stats['seconds'] / base['seconds']
+            if ratio > 1 + tolerance:
+                regressions.append(f"{n_rows} rows, {name}: {base['seconds']:.3f}s -> {stats['seconds']:.3f}s "
+                                   f"({ratio:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dashboard data pipeline on synthetic crime data.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help='dataset sizes to run (default: %(default)s; 10000000 for the large run)')
+    parser.add_argument('--workdir', help='keep generated CSVs and stores here (default: a temporary directory)')
+    parser.add_argument('--output', help='write the results JSON here instead of stdout')
+    parser.add_argument('--baseline', help='compare against this results JSON and exit 1 on regressions')
+    parser.add_argument('--save-baseline', help='also write the results to this path as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before flagging (0.25 = 25%%)')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory (no peak_mb)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='crime-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        results = run(args.rows, workdir, args.seed, trace_memory=not args.no_memory)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import altair as alt
+import numpy as np
+from plotly.basedatatypes import BaseFigure, BasePlotlyType
+
+import perf
+
+# ========================================================
+# SHARED CHART PAYLOAD CACHE                             |
+# ========================================================
+#
+# Built charts are shared by every session in the process: one LRU keyed by a
+# hash of the chart name, the filter state that produced it and the dataset
+# version (store version or model hash), so identical selections from any
+# user skip building the figure again. Altair charts are kept as their
+# Vega-Lite spec (the costly to_dict() step is done once). Plotly figures
+# are kept as figures, which skips running plotly express and validating the
+# traces, but Streamlit still serializes them to JSON on every draw.
+# Entries are evicted by the memory they hold, not by count: a figure or
+# spec keeps several times its JSON size alive as Python objects and NumPy
+# arrays. A refresh of the data simply stops matching the old keys.
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get('CRIME_CHART_CACHE_MB', 64)) * 2 ** 20)
+
+
+def cache_key(name, state, version):
+    """Canonical hash: equal dicts give equal keys regardless of key order."""
+    text = json.dumps({'chart': name, 'state': state, 'version': version}, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def retained_size(obj):
+    """
+    Approximate bytes held by a cached payload: every container, string and
+    NumPy buffer reachable from it, each counted once. Plotly objects are
+    followed through their attributes; anything else counts its own size only.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, np.ndarray):
+            # Views share their base's buffer
+            if obj.base is None:
+                total += obj.nbytes
+            if obj.dtype == object:
+                stack.extend(obj.ravel())
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, (BaseFigure, BasePlotlyType)):
+            stack.append(vars(obj))
+    return total
+
+
+def _payload(chart):
+    # (payload, retained size in bytes)
+    if isinstance(chart, alt.TopLevelMixin):
+        chart = chart.to_dict()
+    return chart, retained_size(chart)
+
+
+class ChartCache:
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (payload, retained size), least recently used first
+        self._lock = threading.Lock()
+
+    def get_or_build(self, name, state, version, build, *args, **kwargs):
+        """The cached payload for (name, state, version), building it with build(*args, **kwargs) on a miss."""
+        key = cache_key(name, state, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Built outside the lock; two sessions missing on the same key at once both build it
+        with perf.span(name, 'chart_build'):
+            payload, size = _payload(build(*args, **kwargs))
+
+        with self._lock:
+            if size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (payload, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.bytes -= evicted_size
+                    self.evictions += 1
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+
+
+# One cache per server process, shared by all sessions
+charts = ChartCache()
+perf.register_gauges('chart_cache', charts.stats)
@@ -0,0 +1,164 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from time_features import DAY_NAMES, SEASON_NAMES, MONTH_TO_SEASON
+
+# ========================================================
+# PRE-AGGREGATED CRIME COUNT CUBE                        |
+# ========================================================
+#
+# Every chart on the Data page is a count over a few dimensions, so the
+# counts are aggregated at ingest (and updated in place by crime_feed deltas)
+# into two dense arrays:
+#
+#   area_day_hour[area, day, hour]   -> area / hour / weekday / season charts
+#   crime_day[crime, day]            -> total and per-crime monthly trends
+#
+# A full (area x crime x day x hour) array would be hundreds of millions of
+# cells; these two projections cover every chart at a few MB. Weekday, month
+# and season are functions of the day, and a year or date-range filter is a
+# contiguous slice of the day axis, so chart latency depends on the number of
+# days selected rather than the number of crime records.
+
+CUBE_COLUMNS = ['DATE OCC', 'AREA NAME', 'Crm Cd Desc', 'HOUR OCC']
+
+
+class CrimeCube:
+
+    def __init__(self, start_date, areas, crimes, area_day_hour, crime_day):
+        self.areas = list(areas)
+        self.crimes = list(crimes)
+        self.area_day_hour = area_day_hour
+        self.crime_day = crime_day
+        self._index_days(pd.Timestamp(start_date))
+
+    def _index_days(self, start_date):
+        self.dates = pd.date_range(start_date, periods=self.crime_day.shape[1], freq='D')
+
+        # Per-day lookups used to fold the day axis into weekday / month / season
+        self._weekday = self.dates.dayofweek.to_numpy()
+        self._season = MONTH_TO_SEASON[self.dates.month.to_numpy()]
+        self._month_starts = np.flatnonzero(self.dates.day == 1)
+        if len(self.dates) and (len(self._month_starts) == 0 or self._month_starts[0] != 0):
+            self._month_starts = np.concatenate([[0], self._month_starts])
+
+    @classmethod
+    def from_frame(cls, crime_data):
+        dates = crime_data['DATE OCC'].dropna()
+        start_date = dates.min().normalize() if len(dates) else pd.Timestamp('2020-01-01')
+        cube = cls(start_date, [], [], np.zeros((0, 0, 24), dtype=np.int32), np.zeros((0, 0), dtype=np.int32))
+        cube.add(crime_data)
+        return cube
+
+    def _grow(self, crime_data):
+        # New labels are appended so existing codes stay valid; the day axis extends either way
+        new_areas = set(crime_data['AREA NAME'].dropna()) - set(self.areas)
+        new_crimes = set(crime_data['Crm Cd Desc'].dropna()) - set(self.crimes)
+        self.areas += sorted(new_areas)
+        self.crimes += sorted(new_crimes)
+
+        dates = crime_data['DATE OCC'].dropna()
+        start_date = self.dates[0] if len(self.dates) else dates.min().normalize()
+        end_date = self.dates[-1] if len(self.dates) else start_date
+        if len(dates):
+            start_date = min(start_date, dates.min().normalize())
+            end_date = max(end_date, dates.max().normalize())
+        before = (self.dates[0] - start_date).days if len(self.dates) else 0
+        after = (end_date - start_date).days + 1 - before - self.crime_day.shape[1]
+
+        self.area_day_hour = np.pad(self.area_day_hour,
+                                    ((0, len(self.areas) - self.area_day_hour.shape[0]), (before, after), (0, 0)))
+        self.crime_day = np.pad(self.crime_day, ((0, len(self.crimes) - self.crime_day.shape[0]), (before, after)))
+        if before or after or not len(self.dates):
+            self._index_days(start_date)
+
+    def add(self, crime_data, sign=1):
+        """Adds (sign=1) or removes (sign=-1) the counts of crime_data rows."""
+        crime_data = crime_data[crime_data['DATE OCC'].notna()]
+        if len(crime_data) == 0:
+            return self
+        self._grow(crime_data)
+
+        day = (crime_data['DATE OCC'].dt.normalize() - self.dates[0]).dt.days.to_numpy()
+        hour = np.clip(crime_data['HOUR OCC'].to_numpy(dtype=np.int64), 0, 23)
+        area_code = pd.Categorical(crime_data['AREA NAME'], categories=self.areas).codes.astype(np.int64)
+        crime_code = pd.Categorical(crime_data['Crm Cd Desc'], categories=self.crimes).codes.astype(np.int64)
+
+        shape = self.area_day_hour.shape
+        valid = area_code >= 0
+        flat = np.ravel_multi_index((area_code[valid], day[valid], hour[valid]), shape)
+        self.area_day_hour += sign * np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype(np.int32)
+
+        shape = self.crime_day.shape
+        valid = crime_code >= 0
+        flat = np.ravel_multi_index((crime_code[valid], day[valid]), shape)
+        self.crime_day += sign * np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype(np.int32)
+        return self
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            start_date=np.array(str(self.dates[0].date())),
+            areas=np.array(self.areas, dtype=str),
+            crimes=np.array(self.crimes, dtype=str),
+            area_day_hour=self.area_day_hour,
+            crime_day=self.crime_day,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as cube:
+            return cls(str(cube['start_date']), cube['areas'].tolist(), cube['crimes'].tolist(),
+                       cube['area_day_hour'], cube['crime_day'])
+
+    # ---- Day axis ------------------------------------------------------
+
+    def day_slice(self, start=None, end=None):
+        """Slice of the day axis covering start..end (inclusive dates)."""
+        lo = 0 if start is None else int(self.dates.searchsorted(pd.Timestamp(start), side='left'))
+        hi = len(self.dates) if end is None else int(self.dates.searchsorted(pd.Timestamp(end), side='right'))
+        return slice(lo, hi)
+
+    def year_slice(self, year):
+        return self.day_slice(pd.Timestamp(year=year, month=1, day=1), pd.Timestamp(year=year, month=12, day=31))
+
+    def years(self):
+        daily = self.crime_day.sum(axis=0)
+        return sorted(set(self.dates.year[daily > 0]))
+
+    # ---- Queries -------------------------------------------------------
+
+    def monthly_counts(self, crime=None):
+        if crime is None:
+            daily = self.crime_day.sum(axis=0)
+        else:
+            daily = self.crime_day[self.crimes.index(crime)]
+        counts = np.add.reduceat(daily, self._month_starts) if len(daily) else daily
+        months = self.dates[self._month_starts].to_period('M').to_timestamp()
+        return pd.DataFrame({'month-year': months, 'count': counts})
+
+    def area_counts(self, days=slice(None)):
+        counts = self.area_day_hour[:, days, :].sum(axis=(1, 2))
+        result = pd.DataFrame({'AREA NAME': self.areas, 'crime_count': counts})
+        return result[result['crime_count'] > 0].reset_index(drop=True)
+
+    def hourly_counts(self, days=slice(None)):
+        counts = self.area_day_hour[:, days, :].sum(axis=(0, 1))
+        result = pd.DataFrame({'HOUR OCC': np.arange(24), 'crime_count': counts})
+        return result[result['crime_count'] > 0].reset_index(drop=True)
+
+    def _daily_totals(self, days):
+        return self.area_day_hour[:, days, :].sum(axis=(0, 2))
+
+    def weekday_counts(self, days=slice(None)):
+        counts = np.bincount(self._weekday[days], weights=self._daily_totals(days), minlength=7).astype(np.int64)
+        result = pd.DataFrame({'DAY OF WEEK': DAY_NAMES, 'crime_count': counts})
+        return result[result['crime_count'] > 0].reset_index(drop=True)
+
+    def season_counts(self, days=slice(None)):
+        counts = np.bincount(self._season[days], weights=self._daily_totals(days), minlength=4).astype(np.int64)
+        return dict(zip(SEASON_NAMES, counts.tolist()))
@@ -0,0 +1,109 @@
+import argparse
+import os
+
+import pandas as pd
+import requests
+
+import crime_store
+from csv_stream import DEFAULT_CHUNKSIZE, iter_csv_chunks
+
+# ========================================================
+# INCREMENTAL LA OPEN DATA INGESTION                     |
+# ========================================================
+#
+# Instead of re-downloading the full rows.csv export, the local store keeps a
+# high-water mark of the newest 'Date Rptd' it has seen. A refresh asks the
+# source only for rows reported on or after that date, and crime_store
+# upserts them by DR_NO (so corrected records replace the old ones) and
+# updates the count cube with just those rows.
+#
+# Sources are plain objects with an iter_chunks(since) generator yielding
+# DataFrames with the CSV export's column names, so a local file (or a local HTTP
+# stand-in for the SODA API) can replace the live feed.
+#
+#     python crime_feed.py                      # refresh from data.lacity.org
+#     python crime_feed.py --file export.csv    # refresh from a local export
+
+SODA_URL = "https://data.lacity.org/resource/2nrs-mtv8.csv"
+
+
+def soda_field(column):
+    # 'Crm Cd Desc' -> 'crm_cd_desc', 'Part 1-2' -> 'part_1_2'
+    return column.lower().replace(' ', '_').replace('-', '_')
+
+
+class SodaSource:
+    """Pages through the Socrata (SODA) API for rows reported since the watermark."""
+
+    def __init__(self, url=SODA_URL, page_size=50000, session=None, chunksize=DEFAULT_CHUNKSIZE):
+        self.url = url
+        self.page_size = page_size
+        self.session = session or requests.Session()
+        self.chunksize = chunksize
+
+    def iter_chunks(self, since=None):
+        params = {'$order': 'dr_no', '$limit': self.page_size}
+        if since is not None:
+            params['$where'] = f"date_rptd >= '{pd.Timestamp(since):%Y-%m-%dT%H:%M:%S}'"
+        columns = {soda_field(col): col for col in crime_store.EXPORT_COLUMNS}
+
+        offset = 0
+        while True:
+            params['$offset'] = offset
+            page_rows = 0
+            # Each page is streamed off the socket in chunks rather than buffered whole
+            for chunk in iter_csv_chunks(self.url, chunksize=self.chunksize, session=self.session,
+                                         params=dict(params), encoding='utf-8'):
+                page_rows += len(chunk)
+                chunk = chunk.rename(columns=columns)
+                yield chunk[[col for col in crime_store.EXPORT_COLUMNS if col in chunk.columns]]
+            if page_rows < self.page_size:
+                break
+            offset += self.page_size
+
+
+class CsvFileSource:
+    """A local CSV export (same layout as rows.csv) filtered to rows reported since the watermark."""
+
+    def __init__(self, path, chunksize=DEFAULT_CHUNKSIZE):
+        self.path = path
+        self.chunksize = chunksize
+
+    def iter_chunks(self, since=None):
+        for chunk in iter_csv_chunks(self.path, chunksize=self.chunksize):
+            if since is not None:
+                chunk = chunk[crime_store.parse_dates(chunk['Date Rptd']) >= pd.Timestamp(since)]
+            yield chunk
+
+
+def refresh(source=None, csv_path=crime_store.CSV_PATH, store_path=crime_store.STORE_PATH):
+    """Brings the local store up to date with the source; returns the number of rows merged."""
+    source = source or SodaSource()
+
+    if crime_store.read_meta(store_path) is None or not os.path.exists(store_path):
+        if os.path.exists(csv_path):
+            crime_store.ensure_store(csv_path, store_path)
+        else:
+            # Nothing local yet: one full fetch seeds the store, streamed chunk by chunk
+            chunks = (crime_store.coerce_types(chunk) for chunk in source.iter_chunks(None))
+            crime_store.write_chunks(chunks, store_path)
+            return crime_store.read_meta(store_path)['rows']
+
+    # The watermark date is re-requested in full: rows reported later that same day
+    # and same-day corrections are picked up, and the DR_NO upsert absorbs the overlap.
+    # A delta is days of records, so it is collected in memory before merging.
+    since = crime_store.read_meta(store_path).get('watermark')
+    chunks = [chunk for chunk in source.iter_chunks(since) if len(chunk)]
+    if not chunks:
+        return 0
+    return crime_store.merge_delta(pd.concat(chunks, ignore_index=True), store_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch new LAPD crime records into the local store.')
+    parser.add_argument('--file', help='read from a local CSV export instead of the SODA API')
+    parser.add_argument('--url', default=SODA_URL, help='SODA endpoint (default: %(default)s)')
+    args = parser.parse_args()
+
+    feed = CsvFileSource(args.file) if args.file else SodaSource(args.url)
+    print(f'Merged {refresh(feed)} rows into {crime_store.STORE_PATH}')
@@ -0,0 +1,305 @@
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import perf
+from crime_store import file_hash
+from time_features import DAY_NAMES
+
+# ========================================================
+# BATCH CRIME PREDICTION SERVICE                         |
+# ========================================================
+#
+# Wraps the trained KNN model for the Predictive Model page. The model is
+# loaded once, the feature-column order is turned into a NumPy template, and
+# whole batches of inputs (e.g. every hour x weekday for one area) are
+# encoded and scored in a single vectorized call instead of one
+# DataFrame + get_dummies + predict per input.
+#
+# knn_model.pkl is an uncompressed joblib file, in which each NumPy array
+# (training matrix, labels) is stored as a raw buffer. It is opened with
+# mmap_mode='r', so those arrays are views onto the page cache that every
+# Streamlit session and server process shares instead of private unpickled
+# copies. The model is used exactly as fitted: on these few discrete,
+# heavily duplicated features brute-force neighbour search is faster than a
+# tree index. Before a model is used, its feature schema is checked against
+# the columns prepare_input_data builds.
+
+MODEL_PATH = os.path.abspath('models/knn_model.pkl')
+FEATURE_COLUMNS_PATH = os.path.abspath('models/feature_columns.pkl')
+TABLE_PATH = os.path.abspath('models/prediction_table.npz')
+MANIFEST_PATH = os.path.abspath('models/model_manifest.json')
+
+NUMERIC_FEATURES = ['DayOfWeek', 'HourOfDay', 'Month', 'IsWeekend']
+AREA_PREFIX = 'AREA_NAME_'
+
+
+def model_version(model_path=MODEL_PATH, manifest_path=MANIFEST_PATH):
+    """Changes whenever the model or its manifest is rewritten; used as a cache key."""
+    version = []
+    for path in (model_path, manifest_path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            version.append(None)
+        else:
+            version.append(f'{stat.st_mtime_ns}-{stat.st_size}')
+    return tuple(version)
+
+
+class ModelSchemaError(ValueError):
+    """The model's features are not the ones the dashboard sends it."""
+
+
+def check_schema(model, feature_columns):
+    """
+    Raises ModelSchemaError unless the model takes exactly feature_columns and
+    every one of them is a column prepare_input_data can fill in (the numeric
+    time features plus AREA_NAME_ dummies). A model trained on other features,
+    e.g. LAT/LON, would otherwise silently score zero-filled inputs.
+    """
+    feature_columns = list(feature_columns)
+    unknown = [col for col in feature_columns if col not in NUMERIC_FEATURES and not col.startswith(AREA_PREFIX)]
+    missing = [col for col in NUMERIC_FEATURES if col not in feature_columns]
+    if unknown or missing:
+        raise ModelSchemaError(f'Model features do not match the dashboard inputs: '
+                               f'unexpected {unknown}, missing {missing}')
+    if not any(col.startswith(AREA_PREFIX) for col in feature_columns):
+        raise ModelSchemaError(f'Model has no {AREA_PREFIX}* features')
+
+    n_features = getattr(model, 'n_features_in_', len(feature_columns))
+    if n_features != len(feature_columns):
+        raise ModelSchemaError(f'Model expects {n_features} features, '
+                               f'feature_columns.pkl lists {len(feature_columns)}')
+    feature_names = getattr(model, 'feature_names_in_', None)
+    if feature_names is not None and list(feature_names) != feature_columns:
+        raise ModelSchemaError('Model was fitted on differently named or ordered feature columns')
+
+
+class CrimePredictor:
+
+    def __init__(self, model, feature_columns):
+        check_schema(model, feature_columns)
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.classes = list(model.classes_)
+
+        # Column positions, resolved once
+        position = {col: i for i, col in enumerate(self.feature_columns)}
+        self._numeric_positions = np.array([position[col] for col in NUMERIC_FEATURES])
+        self._area_positions = {col[len(AREA_PREFIX):]: i for col, i in position.items()
+                                if col.startswith(AREA_PREFIX)}
+        self.areas = sorted(self._area_positions)
+
+    @classmethod
+    def load(cls, model_path=MODEL_PATH, feature_columns_path=FEATURE_COLUMNS_PATH, mmap_mode='r'):
+        return cls(joblib.load(model_path, mmap_mode=mmap_mode), joblib.load(feature_columns_path))
+
+    def prepare_input_data(self, area_name, day_of_week, hour_of_day, month, is_weekend):
+        """
+        Encodes one input or a batch (array-likes of equal length, scalars are
+        broadcast) into a float matrix in the model's feature-column order.
+        Unknown areas leave every AREA_NAME_ column at 0, as get_dummies did.
+        """
+        area_name, day_of_week, hour_of_day, month, is_weekend = np.broadcast_arrays(
+            np.asarray(area_name, dtype=object), day_of_week, hour_of_day, month, is_weekend)
+        n = area_name.size
+
+        features = np.zeros((n, len(self.feature_columns)), dtype=np.float64)
+        features[:, self._numeric_positions] = np.column_stack(
+            [day_of_week.ravel(), hour_of_day.ravel(), month.ravel(), is_weekend.ravel()])
+
+        area_position = np.array([self._area_positions.get(area, -1) for area in area_name.ravel()])
+        known = area_position >= 0
+        features[np.flatnonzero(known), area_position[known]] = 1
+        return features
+
+    @perf.timed('model')
+    def predict(self, *inputs):
+        return self.model.predict(self.prepare_input_data(*inputs))
+
+    @perf.timed('model')
+    def predict_proba(self, *inputs):
+        return self.model.predict_proba(self.prepare_input_data(*inputs))
+
+    @perf.timed('model')
+    def risk_grid(self, area_name, month):
+        """Most likely crime category and its probability for every hour x day of week in one area."""
+        day_of_week, hour_of_day = _week_grid()
+        probabilities = self.predict_proba(area_name, day_of_week, hour_of_day, month,
+                                           (day_of_week >= 5).astype(int))
+        best = probabilities.argmax(axis=1)
+        return _risk_frame(day_of_week, hour_of_day, np.array(self.classes, dtype=object)[best],
+                           probabilities[np.arange(len(best)), best])
+
+
+def _week_grid():
+    day_of_week, hour_of_day = np.meshgrid(np.arange(7), np.arange(24), indexing='ij')
+    return day_of_week.ravel(), hour_of_day.ravel()
+
+
+def _risk_frame(day_of_week, hour_of_day, prediction, probability):
+    return pd.DataFrame({
+        'DAY OF WEEK': np.array(DAY_NAMES)[day_of_week],
+        'HOUR OCC': hour_of_day,
+        'prediction': prediction,
+        'probability': probability,
+    })
+
+
+# ========================================================
+# MODEL MANIFEST                                         |
+# ========================================================
+#
+# Small JSON file written by the notebook next to the pickles. It carries what
+# the Predictive Model page needs before (or without) touching the model:
+# area names, class labels, the feature schema and the training date range.
+
+def write_manifest(path, feature_columns, classes, area_names, date_range=None):
+    manifest = {
+        'area_names': sorted(str(area) for area in area_names),
+        'classes': [str(label) for label in classes],
+        'feature_columns': list(feature_columns),
+        'training_date_range': [str(pd.Timestamp(date).date()) for date in date_range] if date_range else None,
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+@perf.timed('load')
+def load_manifest(path=MANIFEST_PATH, feature_columns_path=FEATURE_COLUMNS_PATH):
+    """Reads the manifest; models saved before it existed fall back to the areas in feature_columns.pkl."""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+
+    feature_columns = joblib.load(feature_columns_path)
+    return {
+        'area_names': sorted(col[len(AREA_PREFIX):] for col in feature_columns if col.startswith(AREA_PREFIX)),
+        'classes': None,
+        'feature_columns': list(feature_columns),
+        'training_date_range': None,
+    }
+
+# ========================================================
+# PRECOMPUTED PREDICTION TABLE                           |
+# ========================================================
+#
+# Every UI input is a small discrete domain (area x day of week x hour x
+# month x weekend flag, ~85k combinations), so the model is evaluated over
+# the whole grid once, offline, and the top-k classes with their
+# probabilities are stored next to the model. A prediction in the request
+# path is then an array index. The table records the hash of the model and
+# feature-column files it was built from and is rebuilt automatically when
+# either of them changes.
+
+TOP_K = 3
+GRID_SHAPE = (7, 24, 12, 2)  # day of week, hour, month (1-12), weekend flag
+
+
+class PredictionTable:
+
+    def __init__(self, areas, classes, top_classes, top_probabilities, model_hash=None):
+        self.areas = list(areas)
+        self.classes = list(classes)
+        # Shape (len(areas) + 1, *GRID_SHAPE, k); the extra area slot holds the "unknown area" encoding
+        self.top_classes = top_classes
+        self.top_probabilities = top_probabilities
+        self.model_hash = model_hash
+        self._area_index = {area: i for i, area in enumerate(self.areas)}
+
+    @classmethod
+    def build(cls, predictor, k=TOP_K, batch_size=20000, model_hash=None):
+        areas = predictor.areas + [None]
+        grid = np.indices((len(areas),) + GRID_SHAPE).reshape(len(GRID_SHAPE) + 1, -1)
+        area_name = np.array(areas, dtype=object)[grid[0]]
+        k = min(k, len(predictor.classes))
+
+        top_classes = np.empty((grid.shape[1], k), dtype=np.int16)
+        top_probabilities = np.empty((grid.shape[1], k), dtype=np.float16)
+        for start in range(0, grid.shape[1], batch_size):
+            rows = slice(start, start + batch_size)
+            probabilities = predictor.predict_proba(area_name[rows], grid[1, rows], grid[2, rows],
+                                                    grid[3, rows] + 1, grid[4, rows])
+            best = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+            top_classes[rows] = best
+            top_probabilities[rows] = np.take_along_axis(probabilities, best, axis=1)
+
+        shape = (len(areas),) + GRID_SHAPE + (k,)
+        return cls(predictor.areas, predictor.classes, top_classes.reshape(shape),
+                   top_probabilities.reshape(shape), model_hash)
+
+    def save(self, path=TABLE_PATH):
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            areas=np.array(self.areas, dtype=str),
+            classes=np.array(self.classes, dtype=str),
+            top_classes=self.top_classes,
+            top_probabilities=self.top_probabilities,
+            model_hash=np.array(str(self.model_hash)),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=TABLE_PATH):
+        with np.load(path) as table:
+            return cls(table['areas'].tolist(), table['classes'].tolist(), table['top_classes'],
+                       table['top_probabilities'], str(table['model_hash']))
+
+    def _index(self, area_name, day_of_week, hour_of_day, month, is_weekend):
+        area_name, day_of_week, hour_of_day, month, is_weekend = np.broadcast_arrays(
+            np.asarray(area_name, dtype=object), day_of_week, hour_of_day, month, is_weekend)
+        unknown = len(self.areas)
+        area = np.array([self._area_index.get(a, unknown) for a in area_name.ravel()])
+        return (area, day_of_week.ravel().astype(int), hour_of_day.ravel().astype(int),
+                month.ravel().astype(int) - 1, is_weekend.ravel().astype(int))
+
+    def top_k(self, area_name, day_of_week, hour_of_day, month, is_weekend):
+        """(class names, probabilities), each of shape (n, k), best first."""
+        index = self._index(area_name, day_of_week, hour_of_day, month, is_weekend)
+        classes = np.array(self.classes, dtype=object)[self.top_classes[index]]
+        return classes, self.top_probabilities[index].astype(np.float64)
+
+    @perf.timed('model')
+    def predict(self, *inputs):
+        return self.top_k(*inputs)[0][:, 0]
+
+    @perf.timed('model')
+    def risk_grid(self, area_name, month):
+        day_of_week, hour_of_day = _week_grid()
+        classes, probabilities = self.top_k(area_name, day_of_week, hour_of_day, month,
+                                            (day_of_week >= 5).astype(int))
+        return _risk_frame(day_of_week, hour_of_day, classes[:, 0], probabilities[:, 0])
+
+
+@perf.timed('load')
+def load_prediction_table(model_path=MODEL_PATH, feature_columns_path=FEATURE_COLUMNS_PATH, table_path=TABLE_PATH):
+    """Loads the table, first (re)building it if it is missing or was built from other model files."""
+    # A table built while train_model.py was replacing the files is keyed by the pair it actually read
+    model_hash = file_hash(model_path) + ':' + file_hash(feature_columns_path)
+    if os.path.exists(table_path):
+        table = PredictionTable.load(table_path)
+        if table.model_hash == model_hash:
+            return table
+
+    table = PredictionTable.build(CrimePredictor.load(model_path, feature_columns_path), model_hash=model_hash)
+    table.save(table_path)
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the precomputed prediction table for the KNN model.')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--feature-columns', default=FEATURE_COLUMNS_PATH)
+    parser.add_argument('--output', default=TABLE_PATH)
+    args = parser.parse_args()
+
+    table = load_prediction_table(args.model, args.feature_columns, args.output)
+    print(f'Prediction table for {len(table.areas)} areas x {len(table.classes)} classes at {args.output}')
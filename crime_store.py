@@ -0,0 +1,365 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import perf
+from crime_cube import CUBE_COLUMNS, CrimeCube
+from csv_stream import DEFAULT_CHUNKSIZE, iter_csv_chunks
+from geo_bins import GEO_COLUMNS, SpatialIndex
+from time_features import add_time_features
+from time_index import TimeIndex
+
+# ========================================================
+# COLUMNAR CRIME DATA STORE                              |
+# ========================================================
+#
+# The raw CSV is parsed once into a typed Parquet file. The dashboard then
+# reads only the columns a section needs instead of re-parsing ~1M rows of
+# text on every cold start. The store is rebuilt when the source CSV changes.
+
+CSV_PATH = os.path.abspath('Crime_Data_from_2020_to_Present.csv')
+STORE_PATH = os.path.abspath('data/crime_data.parquet')
+
+# Bump when the stored schema changes so existing stores get rebuilt
+STORE_VERSION = 2
+
+# Column layout of the rows.csv export
+EXPORT_COLUMNS = [
+    'DR_NO', 'Date Rptd', 'DATE OCC', 'TIME OCC', 'AREA', 'AREA NAME', 'Rpt Dist No', 'Part 1-2',
+    'Crm Cd', 'Crm Cd Desc', 'Mocodes', 'Vict Age', 'Vict Sex', 'Vict Descent', 'Premis Cd',
+    'Premis Desc', 'Weapon Used Cd', 'Weapon Desc', 'Status', 'Status Desc', 'Crm Cd 1',
+    'Crm Cd 2', 'Crm Cd 3', 'Crm Cd 4', 'LOCATION', 'Cross Street', 'LAT', 'LON',
+]
+
+# Low-cardinality text columns kept as pandas categoricals
+CATEGORY_COLUMNS = [
+    'AREA NAME', 'Crm Cd Desc', 'Vict Sex', 'Vict Descent',
+    'Premis Desc', 'Weapon Desc', 'Status', 'Status Desc',
+]
+
+INTEGER_COLUMNS = {
+    'DR_NO': 'int64',
+    'TIME OCC': 'int16',
+    'AREA': 'int8',
+    'Rpt Dist No': 'int16',
+    'Part 1-2': 'int8',
+    'Crm Cd': 'int16',
+    'Vict Age': 'int16',
+}
+
+FLOAT_COLUMNS = {
+    'Premis Cd': 'float32',
+    'Weapon Used Cd': 'float32',
+    'Crm Cd 1': 'float32',
+    'Crm Cd 2': 'float32',
+    'Crm Cd 3': 'float32',
+    'Crm Cd 4': 'float32',
+    'LAT': 'float32',
+    'LON': 'float32',
+}
+
+DATE_COLUMNS = ['Date Rptd', 'DATE OCC']
+
+
+def parse_dates(values):
+    # The CSV export writes "03/01/2020 12:00:00 AM" and the SODA API "2020-03-01T00:00:00.000";
+    # only the date part carries information
+    text = values.astype(str).str[:10]
+    dates = pd.to_datetime(text, format='%m/%d/%Y', errors='coerce')
+    iso = dates.isna() & text.str.match(r'\d{4}-')
+    if iso.any():
+        dates[iso] = pd.to_datetime(text[iso], format='%Y-%m-%d', errors='coerce')
+    return dates
+
+
+def coerce_types(crime_data):
+    for col in DATE_COLUMNS:
+        if col in crime_data.columns:
+            crime_data[col] = parse_dates(crime_data[col])
+
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col in crime_data.columns:
+            values = pd.to_numeric(crime_data[col], errors='coerce')
+            if values.isna().any():
+                # Missing values would force a float column; keep them as nullable ints
+                crime_data[col] = values.astype(dtype.capitalize())
+            else:
+                crime_data[col] = values.astype(dtype)
+
+    for col, dtype in FLOAT_COLUMNS.items():
+        if col in crime_data.columns:
+            crime_data[col] = pd.to_numeric(crime_data[col], errors='coerce').astype(dtype)
+
+    for col in CATEGORY_COLUMNS:
+        if col in crime_data.columns:
+            crime_data[col] = crime_data[col].astype('category')
+
+    if 'DATE OCC' in crime_data.columns and 'TIME OCC' in crime_data.columns:
+        add_time_features(crime_data)
+
+    return crime_data
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _meta_path(store_path):
+    return os.path.splitext(store_path)[0] + '.meta.json'
+
+
+def read_meta(store_path=STORE_PATH):
+    try:
+        with open(_meta_path(store_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(store_path, meta):
+    tmp_path = _meta_path(store_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, _meta_path(store_path))
+
+
+def store_version(store_path=STORE_PATH):
+    """Changes whenever the store is rebuilt or a delta is merged; used as a cache key."""
+    meta = read_meta(store_path) or {}
+    return meta.get('updated')
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def _cube_path(store_path):
+    return os.path.splitext(store_path)[0] + '.cube.npz'
+
+
+class _StoreMeta:
+    # Running row count and high-water marks, updated chunk by chunk; used by
+    # crime_feed to only request newer rows
+
+    def __init__(self):
+        self.rows = 0
+        self.max_dr_no = None
+        self.watermark = None
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        if chunk['DR_NO'].notna().any():
+            dr_no = int(chunk['DR_NO'].max())
+            self.max_dr_no = dr_no if self.max_dr_no is None else max(self.max_dr_no, dr_no)
+        if chunk['Date Rptd'].notna().any():
+            reported = chunk['Date Rptd'].max()
+            self.watermark = reported if self.watermark is None else max(self.watermark, reported)
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'max_dr_no': self.max_dr_no,
+            'watermark': str(self.watermark.date()) if self.watermark is not None else None,
+            'updated': time.time(),
+            'version': STORE_VERSION,
+        }
+
+
+def _arrow_schema(chunk):
+    # Chunks differ in their category sets and in which columns happen to be all-null,
+    # so pin every categorical to int32 dictionary indices and null columns to strings
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+        elif pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def write_chunks(chunks, store_path=STORE_PATH, meta=None, cube=None):
+    """
+    Streams already-coerced chunks into the Parquet store, one row group per chunk,
+    and builds the count cube alongside (or saves `cube`, kept up to date by the
+    caller while the chunks stream through). The meta, and with it the store
+    version, is written last, so a reader that sees the new version also finds
+    the new cube.
+    """
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    tmp_path = store_path + '.tmp'
+    build_cube = cube is None
+    store_meta = _StoreMeta()
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = _arrow_schema(chunk)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            store_meta.update(chunk)
+            if build_cube:
+                if cube is None:
+                    cube = CrimeCube.from_frame(chunk[CUBE_COLUMNS])
+                else:
+                    cube.add(chunk[CUBE_COLUMNS])
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError('no rows to write to the crime data store')
+
+    os.replace(tmp_path, store_path)
+    if cube is not None:
+        cube.save(_cube_path(store_path))
+
+    meta = dict(meta or {})
+    meta.update(store_meta.as_dict())
+    _write_meta(store_path, meta)
+    return store_path
+
+
+def write_store(crime_data, store_path=STORE_PATH, meta=None):
+    """Replaces the store (and its cube) with an already-coerced DataFrame."""
+    return write_chunks([crime_data], store_path, meta)
+
+
+@perf.timed('load')
+def build_store(csv_path=CSV_PATH, store_path=STORE_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    # The CSV is never held in memory as a whole: it is parsed, typed and written chunk by chunk
+    chunks = iter_csv_chunks(csv_path, chunksize=chunksize, transform=coerce_types)
+
+    meta = _source_stat(csv_path)
+    meta['sha256'] = file_hash(csv_path)
+    return write_chunks(chunks, store_path, meta)
+
+
+def iter_store_chunks(store_path=STORE_PATH, columns=None):
+    """Yields the store back one row group at a time."""
+    parquet_file = pq.ParquetFile(store_path)
+    for i in range(parquet_file.num_row_groups):
+        yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+
+
+@perf.timed('load')
+def merge_delta(delta, store_path=STORE_PATH):
+    """Upserts new or changed rows (keyed by DR_NO) into the store and updates the cube in place."""
+    delta = coerce_types(delta.drop_duplicates('DR_NO', keep='last'))
+    # Only the replaced and new rows touch the cube
+    cube = CrimeCube.load(_cube_path(store_path))
+
+    def merged_chunks():
+        # Stream the existing rows through, holding back the ones the delta replaces
+        for chunk in iter_store_chunks(store_path):
+            is_replaced = chunk['DR_NO'].isin(delta['DR_NO'])
+            if is_replaced.any():
+                cube.add(chunk.loc[is_replaced, CUBE_COLUMNS], sign=-1)
+            yield chunk[~is_replaced]
+        cube.add(delta[CUBE_COLUMNS])
+        yield delta
+
+    meta = read_meta(store_path) or {}
+    write_chunks(merged_chunks(), store_path, meta, cube=cube)
+    return len(delta)
+
+
+def ensure_store(csv_path=CSV_PATH, store_path=STORE_PATH):
+    """Builds the Parquet store if it is missing or the source CSV changed."""
+    meta = read_meta(store_path)
+    if meta is not None and meta.get('version') == STORE_VERSION and not os.path.exists(csv_path):
+        # Deployments fed only by crime_feed have no CSV to compare against
+        return store_path
+
+    if meta is None or meta.get('version') != STORE_VERSION or not os.path.exists(store_path):
+        return build_store(csv_path, store_path)
+
+    stat = _source_stat(csv_path)
+    if stat['mtime'] == meta.get('mtime') and stat['size'] == meta.get('size'):
+        return store_path
+
+    # mtime moved (e.g. a fresh checkout); only rebuild if the content changed
+    if file_hash(csv_path) != meta.get('sha256'):
+        return build_store(csv_path, store_path)
+
+    meta.update(stat)
+    _write_meta(store_path, meta)
+    return store_path
+
+
+@perf.timed('load')
+def load_columns(columns=None, csv_path=CSV_PATH, store_path=STORE_PATH):
+    ensure_store(csv_path, store_path)
+    return pd.read_parquet(store_path, columns=columns)
+
+
+def _load_index(index_cls, suffix, build, csv_path, store_path):
+    # An index file kept next to the store, rebuilt by build(store_path) after any store change
+    ensure_store(csv_path, store_path)
+    version = store_version(store_path)
+    path = os.path.splitext(store_path)[0] + suffix
+    index = index_cls.load(path, version)
+    if index is None:
+        index = build(store_path)
+        index.save(path, version)
+    return index
+
+
+@perf.timed('load')
+def load_spatial_index(csv_path=CSV_PATH, store_path=STORE_PATH):
+    """Loads the map's spatial index, rebuilding it from the store's LAT/LON columns after any store change."""
+    return _load_index(SpatialIndex, '.geo.npz',
+                       lambda path: SpatialIndex.from_frame(pd.read_parquet(path, columns=GEO_COLUMNS)),
+                       csv_path, store_path)
+
+
+@perf.timed('load')
+def load_time_index(csv_path=CSV_PATH, store_path=STORE_PATH):
+    """Loads the DATE OCC row index, rebuilding it after any store change."""
+    return _load_index(TimeIndex, '.time.npz',
+                       lambda path: TimeIndex.from_dates(pd.read_parquet(path, columns=['DATE OCC'])['DATE OCC']),
+                       csv_path, store_path)
+
+
+@perf.timed('load')
+def load_date_range(start=None, end=None, columns=None, csv_path=CSV_PATH, store_path=STORE_PATH):
+    """
+    Rows with DATE OCC in start..end (inclusive), in date order. Only the row
+    groups holding those rows are read, so the cost follows the size of the
+    selection rather than the whole history.
+    """
+    rows = load_time_index(csv_path, store_path).rows_between(start, end)
+    parquet_file = pq.ParquetFile(store_path)
+    if len(rows) == 0:
+        schema = parquet_file.schema_arrow
+        return schema.empty_table().select(columns or schema.names).to_pandas()
+
+    group_sizes = np.array([parquet_file.metadata.row_group(i).num_rows
+                            for i in range(parquet_file.num_row_groups)])
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)])
+    group = np.searchsorted(group_starts, rows, side='right') - 1
+    groups = np.unique(group)
+
+    # Where each selected group starts once only those groups are read back to back
+    read_starts = np.zeros(len(group_sizes), dtype=np.int64)
+    read_starts[groups] = np.cumsum(group_sizes[groups]) - group_sizes[groups]
+    table = parquet_file.read_row_groups(groups.tolist(), columns=columns)
+    return table.take(rows - group_starts[group] + read_starts[group]).to_pandas()
+
+
+@perf.timed('load')
+def load_cube(csv_path=CSV_PATH, store_path=STORE_PATH):
+    ensure_store(csv_path, store_path)
+    cube_path = _cube_path(store_path)
+    if not os.path.exists(cube_path):
+        CrimeCube.from_frame(pd.read_parquet(store_path, columns=CUBE_COLUMNS)).save(cube_path)
+    return CrimeCube.load(cube_path)
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+
+import pandas as pd
+import requests
+
+# ========================================================
+# STREAMING CSV READER                                   |
+# ========================================================
+#
+# Reads a crime CSV from a local path or an HTTP(S) URL in fixed-size row
+# chunks. The HTTP body is consumed straight from the socket (no
+# response.text / StringIO copy of the whole file), so peak memory is one
+# chunk plus whatever the consumer keeps, not several times the file size.
+
+DEFAULT_CHUNKSIZE = 100_000
+CSV_ENCODING = "ISO-8859-1"
+
+
+def is_url(source):
+    return isinstance(source, str) and source.startswith(('http://', 'https://'))
+
+
+@contextmanager
+def open_stream(source, session=None, params=None, timeout=60):
+    """Yields a binary file-like object for a path or URL."""
+    if is_url(source):
+        session = session or requests.Session()
+        with session.get(source, params=params, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            # Undo any gzip transfer encoding while streaming
+            response.raw.decode_content = True
+            yield response.raw
+    else:
+        with open(source, 'rb') as f:
+            yield f
+
+
+def iter_csv_chunks(source, chunksize=DEFAULT_CHUNKSIZE, columns=None, transform=None,
+                    session=None, params=None, encoding=CSV_ENCODING):
+    """
+    Yields DataFrames of at most chunksize rows.
+
+    columns projects the CSV while parsing (usecols), and transform (e.g.
+    crime_store.coerce_types) is applied to each chunk before it is yielded.
+    Everything is read as text first so every chunk gets the same dtypes
+    regardless of which values happen to fall in it.
+    """
+    with open_stream(source, session=session, params=params) as stream:
+        reader = pd.read_csv(stream, chunksize=chunksize, usecols=columns, dtype=str, encoding=encoding)
+        for chunk in reader:
+            yield transform(chunk) if transform is not None else chunk
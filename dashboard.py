@@ -1,14 +1,18 @@
 import os
+import time
 import folium
-import joblib
-import pandas as pd
-import requests
 import streamlit as st
 import plotly.express as px
 import altair as alt
-import dask.dataframe as dd
+import chart_cache
+import crime_store
+import crime_predictor
+import dashboard_data
+import data_cache
+import geo_bins
+import perf
+import warmup
 
-from io import StringIO
 from streamlit_folium import st_folium
 from streamlit_option_menu import option_menu
 
@@ -41,417 +45,427 @@ with coly:
         icons=["bar-chart-fill","activity"]
     )
 
+# ========================================================
+# SHARED DATA ACCESS                                     |
+# ========================================================
+
+# The count cube, spatial index, manifest and prediction table come from the cached
+# loaders in data_cache.py: one object per server process, shared by every section and
+# session (and filled by the startup warm-up), so sections must treat them as read-only.
+
+# Charts come out of chart_cache, shared by every session: built once per filter state
+# and data version, then only sent. Altair charts are cached as Vega-Lite specs.
+def draw_chart(name, payload):
+    with perf.span(name, 'chart', payload=payload):
+        if isinstance(payload, dict):
+            st.vega_lite_chart(payload, use_container_width=True)
+        else:
+            st.plotly_chart(payload, use_container_width=True)
+
+
+# ========================================================
+# STARTUP WARM-UP                                        |
+# ========================================================
+
+# The store, indexes and prediction table are built or loaded on a background thread
+# pool once per server process (see warmup.py), straight into the data_cache loaders.
+# Until what this page needs is done, a session shows the progress and checks back
+# instead of building it all inline.
+startup = warmup.start()
+page_tasks = warmup.DATA_TASKS if selection == "Data" else warmup.MODEL_TASKS
+if not startup.done(page_tasks):
+    with st.container(border=True):
+        st.markdown("<h4 class='centered animated-title'>Preparing data...</h4>", unsafe_allow_html=True)
+        task_status = startup.status()
+        for name in page_tasks:
+            st.write(f"{name.replace('_', ' ').capitalize()}: {task_status[name]['status']}")
+    time.sleep(1)
+    st.rerun()
+
+
+# ========================================================
+# DASHBOARD PANELS                                       |
+# ========================================================
+#
+# Each panel is an st.fragment: a widget inside it (theme, year, crime type,
+# Predict...) reruns and re-sends only that panel, not the whole page. The
+# data a panel reads is passed in as its arguments (the shared cube, or the
+# store version its cached loader is keyed by), and the map panel is only
+# computed while its expander is open.
+
 if selection == "Data":
+    crime_cube = data_cache.load_crime_cube(crime_store.store_version())
+
     # TREND ANALYSIS ===================|
 
-    with st.container(border=True):
+    @st.fragment
+    @perf.section('trend')
+    def trend_panel(crime_cube, store_version):
+        with st.container(border=True):
+
+            crime_codes = crime_cube.crimes
+
+            col1, col2, col3 = st.columns([1, 2, 2])
+
+            with col1:
+                select_crime = st.selectbox('Select Crime', crime_codes)
+
+            with col3:
+                # Monthly counts come straight from the cube, no row scan
+                total_graph = chart_cache.charts.get_or_build(
+                    'total_graph', {}, store_version,
+                    lambda: px.line(
+                        dashboard_data.total_crime_data(crime_cube),
+                        x='month-year',
+                        y='total crime',
+                        title='TOTAL CRIME',
+                        height=500
+                    ))
+                draw_chart('total_graph', total_graph)
+
 
-        @st.cache_data()
-        def load_crime_csv():
-            crime_data_csv = os.path.abspath('Crime_Data_from_2020_to_Present.csv')
-            crime_data = pd.read_csv(crime_data_csv)
-            crime_data['DATE OCC'] = pd.to_datetime(crime_data['DATE OCC'], format='%m/%d/%Y')
-            crime_data['month-year'] = crime_data['DATE OCC'].dt.to_period('M')
-            return crime_data
-
-
-        @st.cache_data()
-        def total_crime_data(crime_data):
-            total_crime = crime_data.groupby('month-year').size().reset_index(name='total crime')
-            total_crime = total_crime[total_crime['month-year'] != pd.Period('2024-05', freq='M')]
-            total_crime['month-year'] = total_crime['month-year'].dt.to_timestamp()
-            return total_crime
-
-
-        @st.cache_data()
-        def filter_trend_data(crime_data, selected_crime):
-            crime_trend = crime_data[crime_data['Crm Cd Desc'] == selected_crime]
-            crime_trend['month-year'] = crime_trend['DATE OCC'].dt.to_period('M')
-            occurrences_per_month = crime_trend.groupby('month-year').size().reset_index(name='occurrences')
-            occurrences_per_month = occurrences_per_month[
-                occurrences_per_month['month-year'] != pd.Period('2024-05', freq='M')]
-            occurrences_per_month['month-year'] = occurrences_per_month['month-year'].dt.to_timestamp()
-            return occurrences_per_month
-
-
-        crime_data = load_crime_csv()
-        total_crime = total_crime_data(crime_data)
-        crime_codes = crime_data['Crm Cd Desc'].unique()
-
-        col1, col2, col3 = st.columns([1, 2, 2])
-
-        with col1:
-            select_crime = st.selectbox('Select Crime', crime_codes)
-
-        with col3:
-            total_graph = px.line(
-                total_crime,
-                x='month-year',
-                y='total crime',
-                title='TOTAL CRIME',
-                height=500
-            )
-            st.plotly_chart(total_graph, use_container_width=True)
-
-
-        with col2:
-
-            filter_graph = px.line(
-                filter_trend_data(crime_data, select_crime),
-                x='month-year',
-                y='occurrences',
-                title="CRIME: "+select_crime,
-                height=500
-            )
-            st.plotly_chart(filter_graph, use_container_width=True)
+            with col2:
+
+                filter_graph = chart_cache.charts.get_or_build(
+                    'filter_graph', {'crime': select_crime}, store_version,
+                    lambda: px.line(
+                        dashboard_data.filter_trend_data(crime_cube, select_crime),
+                        x='month-year',
+                        y='occurrences',
+                        title="CRIME: "+select_crime,
+                        height=500
+                    ))
+                draw_chart('filter_graph', filter_graph)
+
+    trend_panel(crime_cube, crime_store.store_version())
 
     # TEMPORAL ANALYSIS ================|
 
-    with st.container(border=True):
+    @st.fragment
+    @perf.section('temporal')
+    def temporal_panel(cube, store_version):
+        with st.container(border=True):
+
+            col1, col2, col3 = st.columns([1,2,1.5])
+
+            with col1:
+
+                # Filters select a slice of the cube's day axis; every chart below sums over that slice
 
-        col1, col2, col3 = st.columns([1,2,1.5])
-
-        with col1:
-
-            # Load data
-            df = pd.read_csv('Crime_Data_from_2020_to_Present.csv', encoding="ISO-8859-1")
-
-            # Getting the date of occurance
-            df["DATE OCC"] = pd.to_datetime(df["DATE OCC"])
-
-
-            # Convert TIME OCC to standard time format
-            def convert_time_occ(time_occ):
-                time_occ_str = str(int(time_occ)).zfill(4)
-                if len(time_occ_str) == 1:
-                    return f"{time_occ_str}:00"
-                elif len(time_occ_str) == 2:
-                    return f"{time_occ_str}:00"
-                elif len(time_occ_str) == 3:
-                    return f"{time_occ_str[0]}:{time_occ_str[1:]}"
-                else:  # length is 4
-                    return f"{time_occ_str[:2]}:{time_occ_str[2:]}"
-
-
-            # Apply conversion
-            df["TIME OCC"] = df["TIME OCC"].apply(convert_time_occ)
-            df_filtered = df.copy()
-            crime_counts = df_filtered.groupby('AREA NAME').size().reset_index(name='crime_count')
-            total_crimes = crime_counts['crime_count'].sum()
-            crime_counts['crime_percentage'] = (crime_counts['crime_count'] / total_crimes) * 100
-            selected_color_theme = 'blues'
-
-            filter_option = st.radio("Select wether to filter data by year or a specific date range:",
-                                     ("Year", "Date Range"))
-
-            if filter_option == "Year":
-                # Extract year from 'DATE OCC'
-                df['year'] = df["DATE OCC"].dt.year
-                year_list = list(df['year'].unique())
-                selected_year = st.selectbox('Select a year', year_list)
-                df_filtered = df[df['year'] == selected_year]
-            else:
-                date1 = st.date_input("Start Date", df["DATE OCC"].min())
-                date2 = st.date_input("End Date", df["DATE OCC"].max())
-                df_filtered = df[(df["DATE OCC"] >= pd.to_datetime(date1)) & (df["DATE OCC"] <= pd.to_datetime(date2))]
-
-            color_theme_list = ['blues', 'cividis', 'greens', 'inferno', 'magma', 'plasma', 'reds', 'rainbow', 'turbo',
-                                'viridis']
-            selected_color_theme = st.selectbox('Select a color theme', color_theme_list)
-
-            # Data by area name
-            crime_counts = df_filtered.groupby('AREA NAME').size().reset_index(name='crime_count')
-
-            # Calculate percentage of crime counts for each area
-            total_crimes = crime_counts['crime_count'].sum()
-            crime_counts['crime_percentage'] = (crime_counts['crime_count'] / total_crimes) * 100
-
-            seasons = {
-                "Spring": (3, 5),
-                "Summer": (6, 8),
-                "Fall": (9, 11),
-                "Winter": (12, 2)
-            }
-
-            # Filter data based on seasons
-            df_filtered_seasons = {}
-            for season, (start_month, end_month) in seasons.items():
-                if start_month < end_month:
-                    df_filtered_seasons[season] = df_filtered[
-                        (df_filtered["DATE OCC"].dt.month >= start_month) & (df_filtered["DATE OCC"].dt.month <= end_month)]
+                selected_color_theme = 'blues'
+
+                filter_option = st.radio("Select wether to filter data by year or a specific date range:",
+                                         ("Year", "Date Range"))
+
+                if filter_option == "Year":
+                    year_list = cube.years()
+                    selected_year = st.selectbox('Select a year', year_list)
+                    days = cube.year_slice(selected_year)
                 else:
-                    df_filtered_seasons[season] = df_filtered[
-                        (df_filtered["DATE OCC"].dt.month >= start_month) | (df_filtered["DATE OCC"].dt.month <= end_month)]
-
-            # Calculate crime percentages for each season
-            crime_counts_seasons = {season: len(df_season) for season, df_season in df_filtered_seasons.items()}
-            total_season_crimes = sum(crime_counts_seasons.values())
-            crime_percentage_seasons = {season: (count / total_season_crimes) * 100 for season, count in
-                                        crime_counts_seasons.items()}
-
-            # Getting the hour from TIME OCC
-            df_filtered["HOUR OCC"] = pd.to_datetime(df_filtered["TIME OCC"], format='mixed').dt.hour
-            crime_counts_hourly = df_filtered.groupby("HOUR OCC").size().reset_index(name='crime_count')
-
-            # Getting day of the week from DATE OCC
-            df_filtered['DAY OF WEEK'] = df_filtered["DATE OCC"].dt.day_name()
-            crime_counts_weekly = df_filtered.groupby("DAY OF WEEK").size().reset_index(name='crime_count')
-
-
-            # Heatmap function
-            def make_heatmap(input_df, input_x, input_y, input_color_theme, name_x, name_y):
-                heatmap = alt.Chart(input_df).mark_rect().encode(
-                    x=alt.X(f'{input_x}:O',
-                            axis=alt.Axis(title=name_x, titleFontSize=18, titlePadding=15, titleFontWeight=900)),
-                    color=alt.Color(f'{input_y}:Q',
-                                    legend=None,
-                                    scale=alt.Scale(scheme=input_color_theme)),
-                    y=alt.Y(f'{input_y}:Q',
-                            axis=alt.Axis(title=name_y, titleFontSize=18, titlePadding=15, titleFontWeight=900))
-                ).properties(width=900
-                             ).configure_axis(
-                    labelFontSize=12,
-                    titleFontSize=14
-                )
-                return heatmap
-
-
-            # Choropleth map function
-            def make_choropleth(input_df, input_id, input_column, input_color_theme):
-                choropleth = px.choropleth(input_df, locations=input_id, color=input_column, locationmode="USA-states",
-                                           color_continuous_scale=input_color_theme,
-                                           range_color=(0, max(input_df[input_column])),
-                                           scope="usa",
-                                           labels={input_column: input_column.capitalize()}
-                                           )
-                choropleth.update_layout(
-                    template='plotly_dark',
-                    plot_bgcolor='rgba(0, 0, 0, 0)',
-                    paper_bgcolor='rgba(0, 0, 0, 0)',
-                    margin=dict(l=0, r=0, t=0, b=0),
-                    height=350
-                )
-                return choropleth
-
-
-            # Donut chart function
-            def make_donut(input_df, input_color_theme):
-                fig = px.pie(input_df, values='crime_percentage', names='AREA NAME', hole=0.45, color='AREA NAME',
-                             color_discrete_sequence=px.colors.qualitative.Dark24, title='Crime Percentage by Area')
-                fig.update_traces(textinfo='percent+label', marker=dict(line=dict(color='#000000', width=2)))
-                fig.update_layout(showlegend=True, template='plotly_dark', colorway=px.colors.qualitative.Dark24)
-                return fig
-            #filters here
-            st.write("#")
-            st.write("#")
-            # Crime percentages by season
-            st.markdown("<h4 class='centered animated-title'>Crime Percentage by Season</h4>", unsafe_allow_html=True)
-            for season, percentage in crime_percentage_seasons.items():
-                st.metric(label=f"{season}", value=f"{percentage:.2f}%")
-
-        with col2:
-            # Heatmap
-            st.markdown("<h4 class='centered animated-title'>Crime Heatmap by State Area</h4>", unsafe_allow_html=True)
-            heatmap = make_heatmap(crime_counts, 'AREA NAME', 'crime_count', selected_color_theme, "Area", "Crime Count")
-            st.altair_chart(heatmap, use_container_width=True)
-
-            # Crime patterns by hour
-            st.markdown("<h4 class='centered animated-title'>Crime Patterns by Hour of the Day</h4>",
-                        unsafe_allow_html=True)
-            crime_patterns_by_hour = make_heatmap(crime_counts_hourly, 'HOUR OCC', 'crime_count', selected_color_theme,
-                                                  "Hour of the day", "Number of crimes")
-            st.altair_chart(crime_patterns_by_hour, use_container_width=True)
-
-
-
-        with col3:
-            # Donut chart for Crime percentages
-            donut_chart = make_donut(crime_counts, selected_color_theme)
-            st.plotly_chart(donut_chart, use_container_width=True)
-
-            # Crime patterns by day of the week
-            st.markdown("<h4 class='centered animated-title'>Crime Patterns by Day of the Week</h4>",
-                        unsafe_allow_html=True)
-            crime_patterns_by_weekly = make_heatmap(crime_counts_weekly, 'DAY OF WEEK', 'crime_count', selected_color_theme,
-                                                    "Day of the Week", "Number of crimes")
-            st.altair_chart(crime_patterns_by_weekly, use_container_width=True)
+                    date1 = st.date_input("Start Date", cube.dates[0])
+                    date2 = st.date_input("End Date", cube.dates[-1])
+                    days = cube.day_slice(date1, date2)
+
+                color_theme_list = ['blues', 'cividis', 'greens', 'inferno', 'magma', 'plasma', 'reds', 'rainbow', 'turbo',
+                                    'viridis']
+                selected_color_theme = st.selectbox('Select a color theme', color_theme_list)
+
+                # Year and date range both come down to a slice of days, which is what the charts depend on
+                filter_state = {'days': [days.start, days.stop]}
+                themed_state = dict(filter_state, theme=selected_color_theme)
+
+                # Counts by area (with percentages), season, hour of the day and day of the week
+                summary = dashboard_data.temporal_summary(cube, days)
+                crime_counts = summary['areas']
+                crime_percentage_seasons = summary['seasons']
+                crime_counts_hourly = summary['hourly']
+                crime_counts_weekly = summary['weekly']
+
+
+                # Heatmap function
+                def make_heatmap(input_df, input_x, input_y, input_color_theme, name_x, name_y):
+                    heatmap = alt.Chart(input_df).mark_rect().encode(
+                        x=alt.X(f'{input_x}:O',
+                                axis=alt.Axis(title=name_x, titleFontSize=18, titlePadding=15, titleFontWeight=900)),
+                        color=alt.Color(f'{input_y}:Q',
+                                        legend=None,
+                                        scale=alt.Scale(scheme=input_color_theme)),
+                        y=alt.Y(f'{input_y}:Q',
+                                axis=alt.Axis(title=name_y, titleFontSize=18, titlePadding=15, titleFontWeight=900))
+                    ).properties(width=900
+                                 ).configure_axis(
+                        labelFontSize=12,
+                        titleFontSize=14
+                    )
+                    return heatmap
+
+
+                # Choropleth map function
+                def make_choropleth(input_df, input_id, input_column, input_color_theme):
+                    choropleth = px.choropleth(input_df, locations=input_id, color=input_column, locationmode="USA-states",
+                                               color_continuous_scale=input_color_theme,
+                                               range_color=(0, max(input_df[input_column])),
+                                               scope="usa",
+                                               labels={input_column: input_column.capitalize()}
+                                               )
+                    choropleth.update_layout(
+                        template='plotly_dark',
+                        plot_bgcolor='rgba(0, 0, 0, 0)',
+                        paper_bgcolor='rgba(0, 0, 0, 0)',
+                        margin=dict(l=0, r=0, t=0, b=0),
+                        height=350
+                    )
+                    return choropleth
+
+
+                # Donut chart function
+                def make_donut(input_df, input_color_theme):
+                    fig = px.pie(input_df, values='crime_percentage', names='AREA NAME', hole=0.45, color='AREA NAME',
+                                 color_discrete_sequence=px.colors.qualitative.Dark24, title='Crime Percentage by Area')
+                    fig.update_traces(textinfo='percent+label', marker=dict(line=dict(color='#000000', width=2)))
+                    fig.update_layout(showlegend=True, template='plotly_dark', colorway=px.colors.qualitative.Dark24)
+                    return fig
+                #filters here
+                st.write("#")
+                st.write("#")
+                # Crime percentages by season
+                st.markdown("<h4 class='centered animated-title'>Crime Percentage by Season</h4>", unsafe_allow_html=True)
+                for season, percentage in crime_percentage_seasons.items():
+                    st.metric(label=f"{season}", value=f"{percentage:.2f}%")
+
+            with col2:
+                # Heatmap
+                st.markdown("<h4 class='centered animated-title'>Crime Heatmap by State Area</h4>", unsafe_allow_html=True)
+                heatmap = chart_cache.charts.get_or_build('heatmap', themed_state, store_version, make_heatmap,
+                                                          crime_counts, 'AREA NAME', 'crime_count', selected_color_theme,
+                                                          "Area", "Crime Count")
+                draw_chart('heatmap', heatmap)
+
+                # Crime patterns by hour
+                st.markdown("<h4 class='centered animated-title'>Crime Patterns by Hour of the Day</h4>",
+                            unsafe_allow_html=True)
+                crime_patterns_by_hour = chart_cache.charts.get_or_build(
+                    'crime_patterns_by_hour', themed_state, store_version, make_heatmap,
+                    crime_counts_hourly, 'HOUR OCC', 'crime_count', selected_color_theme,
+                    "Hour of the day", "Number of crimes")
+                draw_chart('crime_patterns_by_hour', crime_patterns_by_hour)
+
+
+
+            with col3:
+                # Donut chart for Crime percentages
+                # The donut has its own palette, so the color theme is not part of its key
+                donut_chart = chart_cache.charts.get_or_build('donut_chart', filter_state, store_version, make_donut,
+                                                              crime_counts, selected_color_theme)
+                draw_chart('donut_chart', donut_chart)
+
+                # Crime patterns by day of the week
+                st.markdown("<h4 class='centered animated-title'>Crime Patterns by Day of the Week</h4>",
+                            unsafe_allow_html=True)
+                crime_patterns_by_weekly = chart_cache.charts.get_or_build(
+                    'crime_patterns_by_weekly', themed_state, store_version, make_heatmap,
+                    crime_counts_weekly, 'DAY OF WEEK', 'crime_count', selected_color_theme,
+                    "Day of the Week", "Number of crimes")
+                draw_chart('crime_patterns_by_weekly', crime_patterns_by_weekly)
+
+    temporal_panel(crime_cube, crime_store.store_version())
 
     # Geographical Distribution ================|
 
-    with st.container(border=True):
-        col1, col2 = st.columns((0.5, 2))
-        with col1:
-            @st.cache_data
-            def load_data(nrows):
-                url = "https://data.lacity.org/api/views/2nrs-mtv8/rows.csv?accessType=DOWNLOAD"
-                cols = ["LAT", "LON", "Crm Cd Desc"]  # Only necessary columns
-                data = pd.read_csv(url, usecols=cols, nrows=nrows)
-                return data
-
-
-            # Load only the first 20,000 rows for example
-            data = load_data(20000)
-            st.markdown(
-                """
-                <style>
-                div[data-baseweb="select"] {
-                    max-height: 500px;
-                    overflow: auto;
-                }
-                </style>
-                """,
-                unsafe_allow_html=True
-            )
-            # user input
-            crime_types = st.multiselect("Select Crime Types:", options=data["Crm Cd Desc"].unique(),
-                                                 default=data["Crm Cd Desc"].unique())
-
-            # Filter data
-            filtered_data = data[data["Crm Cd Desc"].isin(crime_types)]
-
-            # Aggregate data
-            agg_data = filtered_data.groupby(['LAT', 'LON', 'Crm Cd Desc']).size().reset_index(name='Count')
-
-        with col2:
-            # Create Plotly scatter mapbox with aggregated data
-            fig = px.scatter_mapbox(
-                agg_data,
-                lat="LAT",
-                lon="LON",
-                size="Count",
-                color="Crm Cd Desc",
-                hover_name="Crm Cd Desc",
-                zoom=10,
-                height=500
-            )
-
-            fig.update_layout(mapbox_style="open-street-map")
-            fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
-            fig.update_traces(marker=dict(size=5))  # Smaller marker size
-            fig.update_layout(clickmode='event+select')  # Optimize interactivity
-
-            # Display map in Streamlit
-            st.markdown("<h4 class='centered animated-title'>Geographical Distribution of Crimes</h4>",
-                        unsafe_allow_html=True)
-            st.plotly_chart(fig, use_container_width=True)
+    @st.fragment
+    @perf.section('geographic')
+    def geographic_panel(store_version):
+        # Collapsed by default; nothing below runs (or is sent) until it is opened
+        panel = st.expander("Geographical Distribution of Crimes", on_change="rerun", key="geographic_panel")
+        if not panel.open:
+            return
+
+        with panel:
+            col1, col2 = st.columns((0.5, 2))
+            with col1:
+                # Spatial index over the whole history, shared like the count cube
+                spatial_index = data_cache.load_spatial_index(store_version)
+                st.markdown(
+                    """
+                    <style>
+                    div[data-baseweb="select"] {
+                        max-height: 500px;
+                        overflow: auto;
+                    }
+                    </style>
+                    """,
+                    unsafe_allow_html=True
+                )
+                # user input
+                crime_types = st.multiselect("Select Crime Types:", options=spatial_index.crimes,
+                                                     default=spatial_index.crimes)
+
+                # Aggregate data: one point per grid cell, coarsened until the cells fit the point budget
+                agg_data, map_level = dashboard_data.map_bins(spatial_index, crime_types)
+                st.caption(f"{agg_data['Count'].sum():,} crimes in {len(agg_data):,} map bins "
+                           f"(~{geo_bins.BASE_CELL * (1 << map_level) * 111:.1f} km cells)")
+
+            with col2:
+                # Create Plotly scatter mapbox with aggregated data
+                def make_crime_map(agg_data):
+                    fig = px.scatter_mapbox(
+                        agg_data,
+                        lat="LAT",
+                        lon="LON",
+                        size="Count",
+                        color="Crm Cd Desc",
+                        hover_name="Crm Cd Desc",
+                        labels={"Crm Cd Desc": "Most frequent crime"},
+                        zoom=dashboard_data.MAP_ZOOM,
+                        height=500
+                    )
+
+                    fig.update_layout(mapbox_style="open-street-map")
+                    fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0})
+                    fig.update_layout(clickmode='event+select')  # Optimize interactivity
+                    return fig
+
+
+                # The selection order of crime types does not change the map
+                fig = chart_cache.charts.get_or_build('crime_map', {'crimes': sorted(crime_types)}, store_version,
+                                                      make_crime_map, agg_data)
+
+                # Display map in Streamlit
+                st.markdown("<h4 class='centered animated-title'>Geographical Distribution of Crimes</h4>",
+                            unsafe_allow_html=True)
+                draw_chart('crime_map', fig)
+
+    geographic_panel(crime_store.store_version())
 
 if selection == "Predictive Model":
-    with st.container(border=True):
-        @st.cache_data
-        def download_data(url):
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = StringIO(response.text)
-                return pd.read_csv(data)
-            else:
-                st.error("Failed to download the dataset.")
-                return None
-
-
-        @st.cache_data
-        def load_model():
-            model = joblib.load(os.path.abspath('models/knn_model.pkl'))
-            feature_columns = joblib.load(os.path.abspath('models/feature_columns.pkl'))
-            return model, feature_columns
-
-
-        def prepare_input_data(area_name, day_of_week, hour_of_day, month, is_weekend, feature_columns):
-            input_data = {
-                'AREA_NAME': [area_name],
-                'DayOfWeek': [day_of_week],
-                'HourOfDay': [hour_of_day],
-                'Month': [month],
-                'IsWeekend': [is_weekend]
-            }
-            input_df = pd.DataFrame(input_data)
-            input_df = pd.get_dummies(input_df, columns=['AREA_NAME'])
-
-            for col in feature_columns:
-                if col not in input_df.columns:
-                    input_df[col] = 0
-
-            return input_df
-
-
-        # URL of the dataset
-        url = 'https://data.lacity.org/api/views/2nrs-mtv8/rows.csv?accessType=DOWNLOAD'
-
-        # Loading the dataset
-        df = download_data(url)
-
-        # Preprocessing steps to ensure required columns are available
-        df = df.rename(columns={
-            "Crm Cd Desc": "Crime Code Descript",
-            "AREA NAME": "AREA_NAME"
-        })
-
-        model, feature_columns = load_model()
-
-        # Streamlit Interface
-        st.markdown("<h4 class='centered animated-title'>Crime Prediction Model</h4>", unsafe_allow_html=True)
-        col1, col2 = st.columns((0.5, 2))
-        with col1:
-            st.write('Input Features')
-            area_name = st.selectbox('Area Name', sorted(df['AREA_NAME'].unique()))
-            day_of_week = st.selectbox('Day of the Week', range(7), format_func=lambda x:
-            ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][x])
-            hour_of_day = st.slider('Hour of the Day', 0, 23, 12)
-            month = st.selectbox('Month', range(1, 13))
-            is_weekend = st.selectbox('Is Weekend', [0, 1], format_func=lambda x: 'Yes' if x == 1 else 'No')
-
-            if st.button('Predict'):
-                # Preparing input data (received from the user)
-                input_data = prepare_input_data(area_name, day_of_week, hour_of_day, month, is_weekend, feature_columns)
-
-                # Making a prediction
-                prediction = model.predict(input_data)
-
-                st.write('## Prediction')
-                st.write(f'The predicted crime category is: **{prediction[0]}**')
-        with col2:
-            # Adding a map of Los Angeles in order to display target area
-            st.write('Map of Los Angeles with Predicted Crime Areas')
-
-            # Defining coordinates of Los Angeles
-            la_coords = [34.0522, -118.2437]
-
-            # Creating a map centered on Los Angeles
-            m = folium.Map(location=la_coords, zoom_start=10)
-
-            # Adding coordinates for the area in order to pinpoint it as needed. Coordinate sources: Google
-            area_coords = {
-                'Central': [34.0425, -118.2468],
-                'Hollenbeck': [34.0505, -118.2117],
-                'Southwest': [34.0166, -118.2971],
-                'Rampart': [34.0533, -118.2760],
-                'Hollywood': [34.1019, -118.3286],
-                'Wilshire': [34.0595, -118.3085],
-                'West LA': [34.0443, -118.4426],
-                'Van Nuys': [34.1867, -118.4483],
-                'Pacific': [33.9931, -118.4415],
-                'Northeast': [34.1066, -118.2150],
-                'Newton': [34.0106, -118.2585],
-                'Harbor': [33.7903, -118.2861],
-                '77th Street': [33.9454, -118.2734],
-                'Foothill': [34.2727, -118.4182],
-                'Devonshire': [34.2573, -118.5250],
-                'Southeast': [33.9534, -118.2452],
-                'Mission': [34.2723, -118.4380],
-                'Olympic': [34.0496, -118.2998],
-                'Topanga': [34.2279, -118.6055],
-                'North Hollywood': [34.1870, -118.3863],
-                'N Hollywood': [34.1867, -118.3893],
-                'Valley Traffic': [34.2333, -118.4630],
-                'South Traffic': [33.9720, -118.2895],
-                'West Traffic': [34.0452, -118.4447],
-                'Central Traffic': [34.0407, -118.2534]
-            }
-
-            # Adding a marker to the map
-            if area_name in area_coords:
-                folium.Marker(location=area_coords[area_name], popup=area_name).add_to(m)
-            else:
-                st.warning('Coordinates for the selected area are not available.')
-
-            # Displaying the map in Streamlit
-            st_folium(m, width=700, height=500)
\ No newline at end of file
+    @st.fragment
+    @perf.section('predictive')
+    def predictive_panel(model_version):
+        with st.container(border=True):
+            # Area names and the rest of the model's schema come from its manifest; no dataset download.
+            # Both loaders are keyed on the model files, so a model written by train_model.py is picked up
+            manifest = data_cache.load_manifest(model_version)
+            try:
+                predictor = data_cache.load_prediction_table(model_version)
+            except crime_predictor.ModelSchemaError as e:
+                st.error(f'The saved model cannot be used by this page: {e}')
+                st.stop()
+
+            # Streamlit Interface
+            st.markdown("<h4 class='centered animated-title'>Crime Prediction Model</h4>", unsafe_allow_html=True)
+            col1, col2 = st.columns((0.5, 2))
+            with col1:
+                st.write('Input Features')
+                if manifest.get('training_date_range'):
+                    st.caption('Model trained on crimes from {} to {}'.format(*manifest['training_date_range']))
+                area_name = st.selectbox('Area Name', manifest['area_names'])
+                day_of_week = st.selectbox('Day of the Week', range(7), format_func=lambda x:
+                ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][x])
+                hour_of_day = st.slider('Hour of the Day', 0, 23, 12)
+                month = st.selectbox('Month', range(1, 13))
+                is_weekend = st.selectbox('Is Weekend', [0, 1], format_func=lambda x: 'Yes' if x == 1 else 'No')
+
+                if st.button('Predict'):
+                    # Making a prediction from the input received from the user
+                    prediction = predictor.predict(area_name, day_of_week, hour_of_day, month, is_weekend)
+
+                    st.write('## Prediction')
+                    st.write(f'The predicted crime category is: **{prediction[0]}**')
+            with col2:
+                # Adding a map of Los Angeles in order to display target area
+                st.write('Map of Los Angeles with Predicted Crime Areas')
+
+                # Defining coordinates of Los Angeles
+                la_coords = [34.0522, -118.2437]
+
+                # Creating a map centered on Los Angeles
+                m = folium.Map(location=la_coords, zoom_start=10)
+
+                # Adding coordinates for the area in order to pinpoint it as needed. Coordinate sources: Google
+                area_coords = {
+                    'Central': [34.0425, -118.2468],
+                    'Hollenbeck': [34.0505, -118.2117],
+                    'Southwest': [34.0166, -118.2971],
+                    'Rampart': [34.0533, -118.2760],
+                    'Hollywood': [34.1019, -118.3286],
+                    'Wilshire': [34.0595, -118.3085],
+                    'West LA': [34.0443, -118.4426],
+                    'Van Nuys': [34.1867, -118.4483],
+                    'Pacific': [33.9931, -118.4415],
+                    'Northeast': [34.1066, -118.2150],
+                    'Newton': [34.0106, -118.2585],
+                    'Harbor': [33.7903, -118.2861],
+                    '77th Street': [33.9454, -118.2734],
+                    'Foothill': [34.2727, -118.4182],
+                    'Devonshire': [34.2573, -118.5250],
+                    'Southeast': [33.9534, -118.2452],
+                    'Mission': [34.2723, -118.4380],
+                    'Olympic': [34.0496, -118.2998],
+                    'Topanga': [34.2279, -118.6055],
+                    'North Hollywood': [34.1870, -118.3863],
+                    'N Hollywood': [34.1867, -118.3893],
+                    'Valley Traffic': [34.2333, -118.4630],
+                    'South Traffic': [33.9720, -118.2895],
+                    'West Traffic': [34.0452, -118.4447],
+                    'Central Traffic': [34.0407, -118.2534]
+                }
+
+                # Adding a marker to the map
+                if area_name in area_coords:
+                    folium.Marker(location=area_coords[area_name], popup=area_name).add_to(m)
+                else:
+                    st.warning('Coordinates for the selected area are not available.')
+
+                # Displaying the map in Streamlit
+                with perf.span('folium_map', 'chart', payload=m):
+                    st_folium(m, width=700, height=500)
+
+                # Most likely crime category for every hour x day of the week, scored as one batch
+                st.markdown("<h4 class='centered animated-title'>Predicted Crime Category by Hour and Day</h4>",
+                            unsafe_allow_html=True)
+                def make_risk_chart(risk_grid):
+                    return alt.Chart(risk_grid).mark_rect().encode(
+                        x=alt.X('HOUR OCC:O', axis=alt.Axis(title='Hour of the day')),
+                        y=alt.Y('DAY OF WEEK:O', sort=list(risk_grid['DAY OF WEEK'].unique()),
+                                axis=alt.Axis(title='Day of the Week')),
+                        color=alt.Color('prediction:N', legend=alt.Legend(title='Crime category')),
+                        opacity=alt.Opacity('probability:Q', legend=None),
+                        tooltip=['DAY OF WEEK', 'HOUR OCC', 'prediction', alt.Tooltip('probability:Q', format='.0%')]
+                    )
+
+
+                # Keyed by the model file's hash, so a retrained model gets fresh charts
+                risk_chart = chart_cache.charts.get_or_build(
+                    'risk_chart', {'area': area_name, 'month': month}, predictor.model_hash,
+                    lambda: make_risk_chart(predictor.risk_grid(area_name, month)))
+                draw_chart('risk_chart', risk_chart)
+
+    predictive_panel(crime_predictor.model_version())
+
+# ========================================================
+# PERFORMANCE PANEL (CRIME_PERF_ADMIN=1)                 |
+# ========================================================
+
+if perf.ADMIN:
+    # Server-wide: the latest panel runs of every session, refreshed every few seconds
+    @st.fragment(run_every=5)
+    def performance_panel():
+        st.markdown("#### Performance")
+        spans = perf.history_frame()
+        if spans.empty:
+            st.caption("No panel runs recorded yet")
+            return
+        if perf.profile_requested():
+            st.caption(f"Profiling this session into {perf.PROFILE_DIR}")
+
+        st.write("Latest runs")
+        st.dataframe(spans.head(50), hide_index=True)
+        st.write("Totals since start")
+        st.dataframe(perf.totals_frame(), hide_index=True)
+        st.write("Chart cache")
+        st.json(chart_cache.charts.stats())
+        st.download_button("Prometheus metrics", perf.prometheus_text(), file_name="crime_dashboard.prom")
+
+
+    with st.sidebar:
+        performance_panel()
@@ -0,0 +1,72 @@
+import pandas as pd
+
+import geo_bins
+import perf
+
+# ========================================================
+# DASHBOARD PANEL DATA                                   |
+# ========================================================
+#
+# The data behind each Data-page panel, as plain functions of the count cube
+# or the spatial index. dashboard.py only draws what these return, so the
+# same computations can be imported and timed without Streamlit (see
+# benchmark.py).
+
+# Upper bound on points sent to the browser by the geographic map
+MAX_MAP_POINTS = 5000
+MAP_ZOOM = 10
+
+def partial_month(cube):
+    """
+    First day of the newest month if the data stops before that month's last
+    day (the feed keeps extending it), else None. The trend lines leave it off
+    instead of ending on a drop.
+    """
+    if not len(cube.dates):
+        return None
+    last_day = cube.dates[-1]
+    return None if last_day.is_month_end else last_day.replace(day=1)
+
+
+# Monthly counts come straight from the cube, no row scan
+@perf.timed('aggregate')
+def total_crime_data(cube):
+    total_crime = cube.monthly_counts().rename(columns={'count': 'total crime'})
+    total_crime = total_crime[total_crime['month-year'] != partial_month(cube)]
+    return total_crime
+
+
+@perf.timed('aggregate')
+def filter_trend_data(cube, selected_crime):
+    occurrences_per_month = cube.monthly_counts(selected_crime).rename(columns={'count': 'occurrences'})
+    occurrences_per_month = occurrences_per_month[occurrences_per_month['month-year'] != partial_month(cube)]
+    return occurrences_per_month
+
+
+@perf.timed('aggregate')
+def temporal_summary(cube, days=slice(None)):
+    """Everything the Temporal panel shows for one slice of the cube's day axis."""
+    # Data by area name, with each area's share of the total
+    crime_counts = cube.area_counts(days)
+    total_crimes = crime_counts['crime_count'].sum()
+    crime_counts['crime_percentage'] = (crime_counts['crime_count'] / total_crimes) * 100
+
+    # Crime percentages for each season (Spring: Mar-May, Summer: Jun-Aug, Fall: Sep-Nov, Winter: Dec-Feb)
+    crime_counts_seasons = cube.season_counts(days)
+    total_season_crimes = sum(crime_counts_seasons.values())
+    crime_percentage_seasons = {season: (count / total_season_crimes) * 100 for season, count in
+                                crime_counts_seasons.items()}
+
+    return {
+        'areas': crime_counts,
+        'seasons': crime_percentage_seasons,
+        'hourly': cube.hourly_counts(days),
+        'weekly': cube.weekday_counts(days),
+    }
+
+
+@perf.timed('aggregate')
+def map_bins(spatial_index, crime_types=None, max_points=MAX_MAP_POINTS, zoom=MAP_ZOOM):
+    """Grid bins sized for the map zoom, coarsened until they fit the point budget; returns (bins, level)."""
+    return spatial_index.bins_for_budget(crime_types, max_points=max_points,
+                                         min_level=geo_bins.level_for_zoom(zoom))
@@ -0,0 +1,71 @@
+import streamlit as st
+
+import crime_predictor
+import crime_store
+import perf
+
+# ========================================================
+# SHARED CACHED LOADERS                                  |
+# ========================================================
+#
+# The process-wide st.cache_resource loaders behind the dashboard: the count
+# cube, the map's spatial index, the model manifest and the prediction
+# table. They live here rather than in dashboard.py so the startup warm-up
+# (warmup.py) fills the very caches the sessions read. st.cache_resource
+# hands back the same object on every hit (st.cache_data would pickle and
+# copy it), so callers must treat the results as read-only.
+#
+# Each loader is keyed by the version of the files it reads (the store
+# version or model_version()), so a crime_feed refresh or a retrained model
+# is picked up on the next call, and keeps one entry. The public functions
+# always call the cached ones with every argument in the same positions:
+# Streamlit keys on the arguments as passed, so load_crime_cube(v) and
+# load_crime_cube(v, CSV_PATH) would otherwise be cached twice.
+#
+# No spinners: the warm-up calls these from its own threads, outside any
+# session, and sessions show the warm-up progress instead.
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _crime_cube(store_version, csv_path, store_path):
+    return crime_store.load_cube(csv_path, store_path)
+
+
+@perf.cached('crime_cube')
+def load_crime_cube(store_version, csv_path=crime_store.CSV_PATH, store_path=crime_store.STORE_PATH):
+    return _crime_cube(store_version, csv_path, store_path)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _spatial_index(store_version, csv_path, store_path):
+    return crime_store.load_spatial_index(csv_path, store_path)
+
+
+@perf.cached('spatial_index')
+def load_spatial_index(store_version, csv_path=crime_store.CSV_PATH, store_path=crime_store.STORE_PATH):
+    return _spatial_index(store_version, csv_path, store_path)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _manifest(model_version, manifest_path, feature_columns_path):
+    return crime_predictor.load_manifest(manifest_path, feature_columns_path)
+
+
+@perf.cached('manifest')
+def load_manifest(model_version, manifest_path=crime_predictor.MANIFEST_PATH,
+                  feature_columns_path=crime_predictor.FEATURE_COLUMNS_PATH):
+    return _manifest(model_version, manifest_path, feature_columns_path)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _prediction_table(model_version, model_path, feature_columns_path, table_path):
+    return crime_predictor.load_prediction_table(model_path, feature_columns_path, table_path)
+
+
+# Predictions are looked up in a table precomputed over every possible input; the
+# KNN model itself is only loaded (memory-mapped) if the table has to be rebuilt for a new model file
+@perf.cached('prediction_table')
+def load_prediction_table(model_version, model_path=crime_predictor.MODEL_PATH,
+                          feature_columns_path=crime_predictor.FEATURE_COLUMNS_PATH,
+                          table_path=crime_predictor.TABLE_PATH):
+    return _prediction_table(model_version, model_path, feature_columns_path, table_path)
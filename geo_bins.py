@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+from versioned_npz import load_arrays, save_arrays
+
+# ========================================================
+# SPATIAL INDEX / SERVER-SIDE MAP BINNING                |
+# ========================================================
+#
+# Every record is snapped to a fine base grid (BASE_CELL degrees, ~200 m) and
+# the index keeps one count per (cell, crime type). Coarser levels of the
+# pyramid are the same cells with the indices shifted right by `level` bits,
+# so each level doubles the cell size, like a quadtree. The map asks for the
+# finest level whose cell count fits the point budget, which bounds the
+# payload sent to the browser no matter how many years of records there are.
+# Each cell is drawn as one point: its count over the selected crime types,
+# labelled with the most frequent of them.
+
+BASE_CELL = 2.0 ** -9  # degrees
+MAX_LEVEL = 10
+
+GEO_COLUMNS = ['LAT', 'LON', 'Crm Cd Desc']
+
+
+class SpatialIndex:
+
+    def __init__(self, origin, crimes, lat_idx, lon_idx, crime_code, counts):
+        self.origin = tuple(origin)
+        self.crimes = list(crimes)
+        self.lat_idx = lat_idx
+        self.lon_idx = lon_idx
+        self.crime_code = crime_code
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, crime_data):
+        lat = crime_data['LAT'].to_numpy(dtype=np.float64)
+        lon = crime_data['LON'].to_numpy(dtype=np.float64)
+        crimes = pd.Categorical(crime_data['Crm Cd Desc'])
+        code = crimes.codes.astype(np.int64)
+
+        # The feed records unknown locations as (0, 0) "null island"
+        valid = np.isfinite(lat) & np.isfinite(lon) & (lat != 0) & (lon != 0) & (code >= 0)
+        lat, lon, code = lat[valid], lon[valid], code[valid]
+        origin = (np.floor(lat.min()) if len(lat) else 0.0, np.floor(lon.min()) if len(lon) else 0.0)
+
+        lat_idx = ((lat - origin[0]) / BASE_CELL).astype(np.int64)
+        lon_idx = ((lon - origin[1]) / BASE_CELL).astype(np.int64)
+
+        # Collapse to one entry per (cell, crime type)
+        lat_idx, lon_idx, code, counts = _coarsen(lat_idx, lon_idx, code, np.ones(len(code), dtype=np.int32), 0)
+        return cls(origin, crimes.categories, lat_idx.astype(np.int32), lon_idx.astype(np.int32),
+                   code.astype(np.int16), counts)
+
+    def save(self, path, version=None):
+        save_arrays(
+            path, version,
+            origin=np.array(self.origin),
+            crimes=np.array(self.crimes, dtype=str),
+            lat_idx=self.lat_idx,
+            lon_idx=self.lon_idx,
+            crime_code=self.crime_code,
+            counts=self.counts,
+        )
+
+    @classmethod
+    def load(cls, path, version=None):
+        index = load_arrays(path, version)
+        if index is None:
+            return None
+        return cls(index['origin'], index['crimes'].tolist(), index['lat_idx'], index['lon_idx'],
+                   index['crime_code'], index['counts'])
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def _selected(self, crimes):
+        if crimes is None:
+            return self.lat_idx, self.lon_idx, self.crime_code, self.counts
+        wanted = np.zeros(len(self.crimes), dtype=bool)
+        wanted[[self.crimes.index(crime) for crime in crimes if crime in self.crimes]] = True
+        selected = wanted[self.crime_code]
+        return self.lat_idx[selected], self.lon_idx[selected], self.crime_code[selected], self.counts[selected]
+
+    def _frame(self, level, lat_idx, lon_idx, crime_code, counts):
+        cell = BASE_CELL * (1 << level)
+        return pd.DataFrame({
+            'LAT': self.origin[0] + (lat_idx + 0.5) * cell,
+            'LON': self.origin[1] + (lon_idx + 0.5) * cell,
+            'Crm Cd Desc': np.array(self.crimes, dtype=object)[crime_code],
+            'Count': counts.astype(np.int64),
+        })
+
+    def bins(self, level, crimes=None):
+        """Counts per (cell, crime type) at a pyramid level, with cell-centre coordinates."""
+        lat_idx, lon_idx, crime_code, counts = self._selected(crimes)
+        return self._frame(level, *_coarsen(lat_idx, lon_idx, crime_code, counts, level))
+
+    def bins_for_budget(self, crimes=None, max_points=5000, min_level=0):
+        """
+        One row per cell at the finest level (starting at min_level) with at
+        most max_points cells: the total Count of the selected crime types and
+        the most frequent of them as Crm Cd Desc.
+        """
+        level = min_level
+        cells = _coarsen(*self._selected(crimes), level)
+        # Each coarser level is built from the previous (already smaller) one
+        while _cell_count(cells[0], cells[1]) > max_points and level < MAX_LEVEL:
+            level += 1
+            cells = _coarsen(*cells, 1)
+        binned = self._frame(level, *_cell_totals(*cells))
+        if len(binned) > max_points:
+            binned = binned.nlargest(max_points, 'Count')
+        return binned, level
+
+
+def _coarsen(lat_idx, lon_idx, crime_code, counts, shift):
+    # Merge entries that land in the same (cell >> shift, crime type); a single
+    # int64 key keeps np.unique one-dimensional
+    lat_idx = lat_idx.astype(np.int64) >> shift
+    lon_idx = lon_idx.astype(np.int64) >> shift
+    crime_code = crime_code.astype(np.int64)
+    if len(counts) == 0:
+        return lat_idx, lon_idx, crime_code, counts
+    n_lon = int(lon_idx.max()) + 1
+    n_crimes = int(crime_code.max()) + 1
+    keys = (lat_idx * n_lon + lon_idx) * n_crimes + crime_code
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    merged = np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int32)
+    cell, crime_code = np.divmod(unique_keys, n_crimes)
+    lat_idx, lon_idx = np.divmod(cell, n_lon)
+    return lat_idx, lon_idx, crime_code, merged
+
+
+def _cell_keys(lat_idx, lon_idx):
+    return lat_idx * (int(lon_idx.max()) + 1) + lon_idx
+
+
+def _cell_count(lat_idx, lon_idx):
+    return len(np.unique(_cell_keys(lat_idx, lon_idx))) if len(lat_idx) else 0
+
+
+def _cell_totals(lat_idx, lon_idx, crime_code, counts):
+    # Collapse (cell, crime type) entries to one per cell: the summed count and
+    # the crime type with the largest count in that cell
+    if len(counts) == 0:
+        return lat_idx, lon_idx, crime_code, counts
+    unique_cells, inverse = np.unique(_cell_keys(lat_idx, lon_idx), return_inverse=True)
+    totals = np.bincount(inverse, weights=counts, minlength=len(unique_cells)).astype(np.int64)
+    # Sorted by cell, largest count first; the first entry of each cell is its top type
+    order = np.lexsort((-counts, inverse))
+    first = np.flatnonzero(np.r_[True, np.diff(inverse[order]) != 0])
+    top = order[first]
+    return lat_idx[top], lon_idx[top], crime_code[top], totals
+
+
+def level_for_zoom(zoom, pixels_per_cell=8):
+    # A web-mercator tile is 256 px across 360 degrees at zoom 0
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    level = int(np.floor(np.log2(max(degrees_per_pixel * pixels_per_cell / BASE_CELL, 1.0))))
+    return min(level, MAX_LEVEL)
@@ -0,0 +1,302 @@
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# ========================================================
+# PERFORMANCE INSTRUMENTATION                            |
+# ========================================================
+#
+# Timing spans around data loads, aggregations, model calls and chart
+# renders. A dashboard panel run (a full rerun or a fragment rerun) collects
+# its spans with durations, row counts, cache hits/misses and payload sizes.
+# The finished run goes into a server-wide history for the admin panel, plus
+# running totals that can be exported. Decorated functions called outside a
+# run (train_model.py, benchmark.py, ...) are just called.
+#
+# Switched on through environment variables:
+#
+#   CRIME_PERF_ADMIN=1        show the Performance panel in the sidebar
+#   CRIME_PERF_LOG=path       append one JSON line per run
+#   CRIME_PERF_METRICS=path   rewrite a Prometheus text-format file after each run
+#   CRIME_PERF_PROFILE=dir    cProfile the session opened with ?profile=1, one .prof per run
+#
+# Chart payload sizes cost an extra serialization, so they are only measured
+# when one of these is set.
+
+ADMIN = os.environ.get('CRIME_PERF_ADMIN') == '1'
+LOG_PATH = os.environ.get('CRIME_PERF_LOG')
+METRICS_PATH = os.environ.get('CRIME_PERF_METRICS')
+PROFILE_DIR = os.environ.get('CRIME_PERF_PROFILE')
+ENABLED = bool(ADMIN or LOG_PATH or METRICS_PATH or PROFILE_DIR)
+
+HISTORY_SIZE = 50
+
+_current = contextvars.ContextVar('perf_run', default=None)
+_lock = threading.Lock()
+# Serializes writes of the export files, which happen outside _lock
+_export_lock = threading.Lock()
+# Only one cProfile profiler can be active per process, hence one profiled session at a time
+_profile_lock = threading.Lock()
+history = deque(maxlen=HISTORY_SIZE)
+totals = {}
+# name -> function returning {field: number}, exported as crime_dashboard_<name>_<field> gauges
+gauges = {}
+
+
+class Run:
+    """Spans recorded during one panel run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.seconds = None
+        self.spans = []
+        self._open = []
+
+    def as_dict(self):
+        return {'run': self.name, 'started': round(self.started, 3), 'seconds': self.seconds, 'spans': self.spans}
+
+
+def _rows(result):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, str):
+        return None
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def payload_size(obj):
+    """Bytes a chart (plotly / altair / folium) or frame would take on the wire."""
+    if hasattr(obj, 'to_json'):
+        return len(obj.to_json())
+    if hasattr(obj, 'get_root'):
+        return len(obj.get_root().render())
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, dict):
+        return len(json.dumps(obj, default=str))
+    return None
+
+
+@contextmanager
+def span(name, kind, payload=None):
+    """Times the block as one span of the current run; yields the span dict (set 'rows' on it if useful)."""
+    current = _current.get()
+    if current is None:
+        yield {}
+        return
+
+    event = {'name': name, 'kind': kind}
+    if current._open and current._open[-1].get('kind') == 'cache' and 'cache' not in current._open[-1]:
+        # Work done inside a cached loader means the cache missed
+        current._open[-1]['cache'] = 'miss'
+    current._open.append(event)
+    start = time.perf_counter()
+    try:
+        yield event
+    finally:
+        event['seconds'] = round(time.perf_counter() - start, 6)
+        current._open.pop()
+        if kind == 'cache':
+            event.setdefault('cache', 'hit')
+        if payload is not None and ENABLED:
+            event['bytes'] = payload_size(payload)
+        current.spans.append(event)
+
+
+def timed(kind):
+    """Decorator: records each call as a span named after the function, with the result's length as rows."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(func.__qualname__, kind) as event:
+                result = func(*args, **kwargs)
+                event['rows'] = _rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def cached(name):
+    """Decorator for an st.cache_resource / st.cache_data function: records the lookup as a hit or miss."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                # e.g. a page-level load outside any panel: it becomes a run of its own
+                with run(name):
+                    return wrapper(*args, **kwargs)
+            with span(name, 'cache'):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def run(name, profile=False):
+    """One panel run. Nested inside another run it is just a span of that run."""
+    if _current.get() is not None:
+        with span(name, 'section'):
+            yield
+        return
+
+    current = Run(name)
+    token = _current.set(current)
+    profiler = _start_profile() if profile else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.seconds = round(time.perf_counter() - start, 6)
+        if profiler is not None:
+            _stop_profile(profiler, current)
+        _current.reset(token)
+        _finish(current)
+
+
+def section(name):
+    """Decorator for a dashboard panel (fragment) function: every call is a run."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with run(name, profile=profile_requested()):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---- Profiling ---------------------------------------------------------
+
+def profile_requested():
+    if not PROFILE_DIR:
+        return False
+    try:
+        import streamlit as st
+        return st.query_params.get('profile') == '1'
+    except Exception:
+        return False
+
+
+def _start_profile():
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) is already active
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _stop_profile(profiler, current):
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f'{current.name}-{current.started:.3f}.prof'))
+    finally:
+        _profile_lock.release()
+
+
+# ---- Export ------------------------------------------------------------
+
+def _finish(current):
+    with _lock:
+        history.append(current)
+        _add_totals(current)
+    # prometheus_text() takes _lock itself
+    with _export_lock:
+        if METRICS_PATH:
+            _write_text(METRICS_PATH, prometheus_text())
+        if LOG_PATH:
+            with open(LOG_PATH, 'a') as f:
+                f.write(json.dumps(current.as_dict()) + '\n')
+
+
+def _add_totals(current):
+    key = (current.name, 'run')
+    entry = totals.setdefault(key, {'count': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+    entry['count'] += 1
+    entry['seconds'] += current.seconds
+    for event in current.spans:
+        entry = totals.setdefault((event['name'], event['kind']),
+                                  {'count': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0, 'hits': 0, 'misses': 0})
+        entry['count'] += 1
+        entry['seconds'] += event['seconds']
+        entry['rows'] += event.get('rows') or 0
+        entry['bytes'] += event.get('bytes') or 0
+        entry['hits'] += event.get('cache') == 'hit'
+        entry['misses'] += event.get('cache') == 'miss'
+
+
+def _write_text(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+METRICS = [
+    ('count', 'crime_dashboard_calls_total', 'Number of runs / spans'),
+    ('seconds', 'crime_dashboard_seconds_total', 'Wall time spent'),
+    ('rows', 'crime_dashboard_rows_total', 'Rows returned'),
+    ('bytes', 'crime_dashboard_payload_bytes_total', 'Serialized chart payload bytes'),
+    ('hits', 'crime_dashboard_cache_hits_total', 'Cache hits'),
+    ('misses', 'crime_dashboard_cache_misses_total', 'Cache misses'),
+]
+
+
+def register_gauges(name, func):
+    with _lock:
+        gauges[name] = func
+
+
+def prometheus_text():
+    """Running totals (and registered gauges) in the Prometheus text exposition format."""
+    # Other sessions' runs update totals while this formats them, so work on a copy
+    with _lock:
+        totals_items = sorted((key, dict(entry)) for key, entry in totals.items())
+        gauge_items = list(gauges.items())
+    lines = []
+    for field, metric, description in METRICS:
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} counter']
+        for (name, kind), entry in totals_items:
+            if field in ('rows', 'bytes', 'hits', 'misses') and not entry[field]:
+                continue
+            name = name.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'{metric}{{name="{name}",kind="{kind}"}} {entry[field]:.12g}')
+    for name, func in gauge_items:
+        for field, value in func().items():
+            if value is not None:
+                lines += [f'# TYPE crime_dashboard_{name}_{field} gauge', f'crime_dashboard_{name}_{field} {value:.12g}']
+    return '\n'.join(lines) + '\n'
+
+
+def history_frame():
+    """Spans of the recorded runs, newest run first, for the admin panel."""
+    with _lock:
+        runs = list(history)
+    rows = [{'run': current.name, 'started': pd.Timestamp(current.started, unit='s'), **event}
+            for current in reversed(runs) for event in current.spans]
+    return pd.DataFrame(rows, columns=['run', 'started', 'name', 'kind', 'seconds', 'rows', 'cache', 'bytes'])
+
+
+def totals_frame():
+    with _lock:
+        items = sorted(totals.items(), key=lambda item: -item[1]['seconds'])
+    return pd.DataFrame([{'name': name, 'kind': kind, **entry} for (name, kind), entry in items],
+                        columns=['name', 'kind', 'count', 'seconds', 'rows', 'bytes', 'hits', 'misses'])
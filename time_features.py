@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# ========================================================
+# VECTORIZED TIME FEATURES                               |
+# ========================================================
+#
+# TIME OCC is an HHMM integer (e.g. 2130 -> 21:30), so hour and minute come
+# straight out of integer arithmetic instead of building and re-parsing a
+# time string per row. Everything is computed in whole-column NumPy passes
+# and stored as int8.
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SEASON_NAMES = ['Spring', 'Summer', 'Fall', 'Winter']
+
+# Index 0 is the "unknown month" slot for unparseable dates
+MONTH_TO_SEASON = np.array([-1, 3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3], dtype=np.int8)
+
+FEATURE_COLUMNS = ['HOUR OCC', 'MINUTE OCC', 'DAY OF WEEK', 'MONTH OCC', 'SEASON', 'IS WEEKEND']
+
+# Column names used by the notebook and the predictive model
+MODEL_FEATURE_NAMES = {
+    'DAY OF WEEK': 'DayOfWeek',
+    'HOUR OCC': 'HourOfDay',
+    'MONTH OCC': 'Month',
+    'IS WEEKEND': 'IsWeekend',
+}
+
+
+def split_time_occ(time_occ):
+    time_occ = pd.to_numeric(pd.Series(time_occ), errors='coerce').fillna(0).to_numpy(dtype=np.int16)
+    hour = (time_occ // 100).astype(np.int8)
+    minute = (time_occ % 100).astype(np.int8)
+    return hour, minute
+
+
+def time_features(date_occ, time_occ):
+    date_occ = pd.to_datetime(pd.Series(date_occ))
+    hour, minute = split_time_occ(time_occ)
+
+    # Monday=0 ... Sunday=6, and 1-12 for the month; NaT dates become -1 / 0
+    day_of_week = date_occ.dt.dayofweek.fillna(-1).to_numpy(dtype=np.int8)
+    month = date_occ.dt.month.fillna(0).to_numpy(dtype=np.int8)
+
+    return pd.DataFrame({
+        'HOUR OCC': hour,
+        'MINUTE OCC': minute,
+        'DAY OF WEEK': day_of_week,
+        'MONTH OCC': month,
+        'SEASON': MONTH_TO_SEASON[month],
+        'IS WEEKEND': (day_of_week >= 5).astype(np.int8),
+    }, index=date_occ.index)
+
+
+def add_time_features(df, date_col='DATE OCC', time_col='TIME OCC', names=None):
+    """Adds the time feature columns to df in place; names optionally renames them (e.g. MODEL_FEATURE_NAMES)."""
+    features = time_features(df[date_col], df[time_col])
+    if names is not None:
+        features = features[list(names)].rename(columns=names)
+    features.index = df.index
+    for col in features.columns:
+        df[col] = features[col]
+    return df
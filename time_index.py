@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from versioned_npz import load_arrays, save_arrays
+
+# ========================================================
+# SORTED TIME INDEX                                      |
+# ========================================================
+#
+# Row-level counterpart of the count cube's day axis. The store's row numbers
+# are kept ordered by DATE OCC, with the offset of every day's first row, so
+# the rows of a year or date range are one contiguous (zero-copy) slice found
+# with searchsorted instead of a boolean mask over the whole history. The
+# store itself stays in ingest order; the index is rebuilt after any change.
+
+
+class TimeIndex:
+
+    def __init__(self, start_date, day_offsets, rows):
+        # rows[day_offsets[d]:day_offsets[d + 1]] are the store rows that occurred on day d
+        self.day_offsets = day_offsets
+        self.rows = rows
+        self.dates = pd.date_range(start_date, periods=len(day_offsets) - 1, freq='D')
+
+    @classmethod
+    def from_dates(cls, date_occ):
+        """date_occ: the store's DATE OCC column, in store row order. Rows without a date are left out."""
+        date_occ = pd.to_datetime(pd.Series(date_occ)).dt.normalize()
+        valid = date_occ.notna().to_numpy()
+        if not valid.any():
+            return cls(pd.Timestamp('2020-01-01'), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+
+        start_date = date_occ[valid].min()
+        day = (date_occ[valid] - start_date).dt.days.to_numpy()
+        rows = np.flatnonzero(valid)[np.argsort(day, kind='stable')].astype(np.int32)
+        day_offsets = np.concatenate([[0], np.cumsum(np.bincount(day))]).astype(np.int64)
+        return cls(start_date, day_offsets, rows)
+
+    def save(self, path, version=None):
+        save_arrays(
+            path, version,
+            start_date=np.array(str(self.dates[0].date()) if len(self.dates) else '2020-01-01'),
+            day_offsets=self.day_offsets,
+            rows=self.rows,
+        )
+
+    @classmethod
+    def load(cls, path, version=None):
+        index = load_arrays(path, version)
+        if index is None:
+            return None
+        return cls(str(index['start_date']), index['day_offsets'], index['rows'])
+
+    def row_slice(self, start=None, end=None):
+        """Slice of self.rows covering start..end (inclusive dates)."""
+        lo = 0 if start is None else int(self.dates.searchsorted(pd.Timestamp(start), side='left'))
+        hi = len(self.dates) if end is None else int(self.dates.searchsorted(pd.Timestamp(end), side='right'))
+        return slice(int(self.day_offsets[lo]), int(self.day_offsets[hi]))
+
+    def rows_between(self, start=None, end=None):
+        return self.rows[self.row_slice(start, end)]
+
+    def rows_in_year(self, year):
+        return self.rows_between(pd.Timestamp(year=year, month=1, day=1), pd.Timestamp(year=year, month=12, day=31))
@@ -0,0 +1,314 @@
+import argparse
+import json
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.neighbors import KNeighborsClassifier, NearestNeighbors
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import crime_store
+from crime_predictor import check_schema, write_manifest
+
+# ========================================================
+# MODEL TRAINING PIPELINE                                |
+# ========================================================
+#
+# Command-line version of the final model in "Current ML Model.ipynb":
+# general crime categories, AREA_NAME dummies + day/hour/month/weekend
+# features, StandardScaler, SMOTEENN, and a KNN whose n_neighbors is tuned
+# by cross-validation. SMOTEENN only ever resamples the training part of a
+# split, so held-out and cross-validation scores are measured on real
+# records. Resampling does not depend on k, so each training fold is
+# resampled once and a single k_max-neighbour query per validation fold
+# scores every k. It reads the local columnar store (the time features are
+# already computed there), runs the neighbour queries across all cores, and
+# writes the artifacts atomically so the dashboard never sees a half-written
+# model.
+#
+#     python train_model.py                 # full history, all cores
+#     python train_model.py --sample 200000 --jobs 4
+#     python train_model.py --since 2023-01-01
+
+MODELS_DIR = os.path.abspath('models')
+TRAIN_COLUMNS = ['DATE OCC', 'AREA NAME', 'Crm Cd Desc', 'DAY OF WEEK', 'HOUR OCC', 'MONTH OCC', 'IS WEEKEND']
+FEATURES = ['AREA_NAME', 'DayOfWeek', 'HourOfDay', 'Month', 'IsWeekend']
+# SMOTE interpolates between a record and its k nearest neighbours of the same class
+SMOTE_NEIGHBORS = 5
+MIN_CLASS_SAMPLES = SMOTE_NEIGHBORS + 1
+TEST_SIZE = 0.2
+
+# Crime descriptions grouped into general categories (same mapping as the notebook)
+CRIME_MAPPING = {
+    'INTIMATE PARTNER - SIMPLE ASSAULT': 'Assault-Related',
+    'BRANDISH WEAPON': 'Weapon-Related',
+    'ROBBERY': 'Theft-Related',
+    'ASSAULT WITH DEADLY WEAPON, AGGRAVATED ASSAULT': 'Assault-Related',
+    'BATTERY - SIMPLE ASSAULT': 'Assault-Related',
+    'BATTERY WITH SEXUAL CONTACT': 'Assault-Related',
+    'HUMAN TRAFFICKING - INVOLUNTARY SERVITUDE': 'Human Trafficking',
+    'INTIMATE PARTNER - AGGRAVATED ASSAULT': 'Assault-Related',
+    'SEX,UNLAWFUL(INC MUTUAL CONSENT, PENETRATION W/ FRGN OBJ)': 'Sexual Crime',
+    'CHILD ABUSE (PHYSICAL) - SIMPLE ASSAULT': 'Child Abuse',
+    'RAPE, FORCIBLE': 'Sexual Crime',
+    'ORAL COPULATION': 'Sexual Crime',
+    'HUMAN TRAFFICKING - COMMERCIAL SEX ACTS': 'Human Trafficking',
+    'THEFT PLAIN - PETTY ($950 & UNDER)': 'Theft-Related',
+    'RESISTING ARREST': 'Resisting Arrest',
+    'VANDALISM - MISDEAMEANOR ($399 OR UNDER)': 'Vandalism',
+    'CRIMINAL THREATS - NO WEAPON DISPLAYED': 'Threat-Related',
+    'THEFT, PERSON': 'Theft-Related',
+    'DISCHARGE FIREARMS/SHOTS FIRED': 'Weapon-Related',
+    'RAPE, ATTEMPTED': 'Sexual Crime',
+    'THEFT-GRAND ($950.01 & OVER)EXCPT,GUNS,FOWL,LIVESTK,PROD': 'Theft-Related',
+    'ATTEMPTED ROBBERY': 'Theft-Related',
+    'OTHER ASSAULT': 'Assault-Related',
+    'BATTERY POLICE (SIMPLE)': 'Assault-Related',
+    'VANDALISM - FELONY ($400 & OVER, ALL CHURCH VANDALISMS)': 'Vandalism',
+    'SHOTS FIRED AT MOVING VEHICLE, TRAIN OR AIRCRAFT': 'Weapon-Related',
+    'BURGLARY FROM VEHICLE': 'Burglary',
+    'ASSAULT WITH DEADLY WEAPON ON POLICE OFFICER': 'Assault-Related',
+    'OTHER MISCELLANEOUS CRIME': 'Other',
+    'THROWING OBJECT AT MOVING VEHICLE': 'Weapon-Related',
+    'ARSON': 'Arson',
+    'DISTURBING THE PEACE': 'Disturbing the Peace',
+    'KIDNAPPING': 'Kidnapping',
+    'WEAPONS POSSESSION/BOMBING': 'Weapon-Related',
+    'SEXUAL PENETRATION W/FOREIGN OBJECT': 'Sexual Crime',
+    'INDECENT EXPOSURE': 'Sexual Crime',
+    'THEFT PLAIN - ATTEMPT': 'Theft-Related',
+    'LYNCHING': 'Assault-Related',
+    'VEHICLE - ATTEMPT STOLEN': 'Vehicle Theft',
+    'THREATENING PHONE CALLS/LETTERS': 'Threat-Related',
+    'SODOMY/SEXUAL CONTACT B/W PENIS OF ONE PERS TO ANUS OTH': 'Sexual Crime',
+    'FALSE IMPRISONMENT': 'Kidnapping',
+    'BATTERY ON A FIREFIGHTER': 'Assault-Related',
+    'BURGLARY': 'Burglary',
+    'KIDNAPPING - GRAND ATTEMPT': 'Kidnapping',
+    'BUNCO, GRAND THEFT': 'Theft-Related',
+    'BOMB SCARE': 'Threat-Related',
+    'CRIMINAL HOMICIDE': 'Homicide',
+    'LEWD CONDUCT': 'Sexual Crime',
+    'BURGLARY, ATTEMPTED': 'Burglary',
+    'PURSE SNATCHING': 'Theft-Related',
+    'CHILD ABUSE (PHYSICAL) - AGGRAVATED ASSAULT': 'Child Abuse',
+    'VIOLATION OF COURT ORDER': 'Court Violation',
+    'STALKING': 'Stalking',
+    'MANSLAUGHTER, NEGLIGENT': 'Homicide',
+    'VEHICLE - STOLEN': 'Vehicle Theft',
+    'LYNCHING - ATTEMPTED': 'Assault-Related',
+    'CRM AGNST CHLD (13 OR UNDER) (14-15 & SUSP 10 YRS OLDER)': 'Child Abuse',
+    'THEFT FROM MOTOR VEHICLE - PETTY ($950 & UNDER)': 'Theft-Related',
+    'EXTORTION': 'Extortion',
+    'LETTERS, LEWD  -  TELEPHONE CALLS, LEWD': 'Threat-Related',
+    'SHOTS FIRED AT INHABITED DWELLING': 'Weapon-Related',
+    'THEFT FROM PERSON - ATTEMPT': 'Theft-Related',
+    'RECKLESS DRIVING': 'Reckless Driving',
+    'CHILD ANNOYING (17YRS & UNDER)': 'Child Abuse',
+    'CHILD STEALING': 'Kidnapping',
+    'CHILD NEGLECT (SEE 300 W.I.C.)': 'Child Abuse',
+    'PIMPING': 'Sexual Crime',
+    'VIOLATION OF TEMPORARY RESTRAINING ORDER': 'Court Violation',
+    'BIKE - STOLEN': 'Theft-Related',
+    'PICKPOCKET': 'Theft-Related',
+    'THEFT FROM MOTOR VEHICLE - GRAND ($950.01 AND OVER)': 'Theft-Related',
+    'VIOLATION OF RESTRAINING ORDER': 'Court Violation',
+    'BURGLARY FROM VEHICLE, ATTEMPTED': 'Burglary',
+    'FAILURE TO YIELD': 'Traffic Violation',
+    'SHOPLIFTING - PETTY THEFT ($950 & UNDER)': 'Theft-Related',
+    'CONTEMPT OF COURT': 'Court Violation',
+    'VEHICLE, STOLEN - OTHER (MOTORIZED SCOOTERS, BIKES, ETC)': 'Vehicle Theft',
+    'LEWD/LASCIVIOUS ACTS WITH CHILD': 'Sexual Crime',
+    'CRUELTY TO ANIMALS': 'Animal Cruelty',
+    'DEFRAUDING INNKEEPER/THEFT OF SERVICES, OVER $950.01': 'Theft-Related',
+    'THEFT FROM MOTOR VEHICLE - ATTEMPT': 'Theft-Related',
+    'CONSPIRACY': 'Conspiracy',
+    'REPLICA FIREARMS(SALE,DISPLAY,MANUFACTURE OR DISTRIBUTE)': 'Weapon-Related',
+    'TRESPASSING': 'Trespassing',
+    'FALSE POLICE REPORT': 'False Report',
+    'PANDERING': 'Sexual Crime',
+    'PURSE SNATCHING - ATTEMPT': 'Theft-Related',
+    'BEASTIALITY, CRIME AGAINST NATURE SEXUAL ASSLT WITH ANIM': 'Sexual Crime',
+    'BUNCO, PETTY THEFT': 'Theft-Related',
+    'SHOPLIFTING-GRAND THEFT ($950.01 & OVER)': 'Theft-Related',
+    'FIREARMS EMERGENCY PROTECTIVE ORDER (FIREARMS EPO)': 'Weapon-Related',
+    'INCITING A RIOT': 'Disturbing the Peace',
+    'BUNCO, ATTEMPT': 'Theft-Related',
+    'GRAND THEFT / INSURANCE FRAUD': 'Theft-Related'
+}
+
+
+def load_training_data(sample=None, seed=42, since=None, until=None,
+                       csv_path=crime_store.CSV_PATH, store_path=crime_store.STORE_PATH):
+    if since is None and until is None:
+        crime_data = crime_store.load_columns(TRAIN_COLUMNS, csv_path, store_path)
+    else:
+        # A training window only reads the rows that fall inside it
+        crime_data = crime_store.load_date_range(since, until, TRAIN_COLUMNS, csv_path, store_path)
+    crime_data = crime_data.dropna(subset=['DATE OCC', 'AREA NAME', 'Crm Cd Desc'])
+    if sample is not None and sample < len(crime_data):
+        crime_data = crime_data.sample(sample, random_state=seed)
+
+    data = pd.DataFrame({
+        'AREA_NAME': crime_data['AREA NAME'].astype(str),
+        'DayOfWeek': crime_data['DAY OF WEEK'],
+        'HourOfDay': crime_data['HOUR OCC'],
+        'Month': crime_data['MONTH OCC'],
+        'IsWeekend': crime_data['IS WEEKEND'],
+        'General_Crime_Category': crime_data['Crm Cd Desc'].astype(str).map(CRIME_MAPPING).fillna('Other'),
+    })
+    date_range = (crime_data['DATE OCC'].min(), crime_data['DATE OCC'].max())
+    return data, date_range
+
+
+def build_features(data):
+    # Removing very small classes so SMOTEENN has enough neighbours
+    class_counts = data['General_Crime_Category'].value_counts()
+    data = data[data['General_Crime_Category'].isin(class_counts[class_counts >= MIN_CLASS_SAMPLES].index)]
+
+    X = pd.get_dummies(data[FEATURES], columns=['AREA_NAME'])
+    y = data['General_Crime_Category']
+    return X, y
+
+
+def smote_neighbors(y, cv):
+    """
+    SMOTE's k_neighbors, lowered when the smallest class would have fewer than
+    k + 1 records in a cross-validation training fold (stratified folds hold
+    out at most ceil(count / cv) records of each class).
+    """
+    smallest = y.value_counts().min()
+    return max(1, min(SMOTE_NEIGHBORS, smallest - math.ceil(smallest / cv) - 1))
+
+
+def fit_resampled(X, y, resample=True, smote_k=SMOTE_NEIGHBORS, jobs=-1, seed=42):
+    """Fits the scaler on X and returns it with the scaled (and, if resample, SMOTEENN-balanced) training data."""
+    scaler = StandardScaler().fit(X)
+    X = scaler.transform(X)
+    if resample:
+        from imblearn.combine import SMOTEENN
+        from imblearn.over_sampling import SMOTE
+        smote = SMOTE(k_neighbors=smote_k, random_state=seed)
+        X, y = SMOTEENN(smote=smote, random_state=seed, n_jobs=jobs).fit_resample(X, y)
+    return scaler, X, y
+
+
+def tune_k(X, y, k_max=30, cv=5, jobs=-1, resample=True, seed=42):
+    """
+    Accuracy of every n_neighbors in 1..k_max on each of `cv` stratified folds,
+    shape (cv, k_max). Only the training part of a fold is scaled and resampled,
+    once per fold; the k_max nearest neighbours of the validation rows then give
+    the majority vote for every smaller k (ties go to the first class, as in
+    KNeighborsClassifier).
+    """
+    smote_k = smote_neighbors(y, cv)
+    scores = np.empty((cv, k_max))
+    for fold, (fit_rows, val_rows) in enumerate(StratifiedKFold(cv).split(X, y)):
+        scaler, X_fit, y_fit = fit_resampled(X[fit_rows], y.iloc[fit_rows], resample, smote_k, jobs, seed)
+        classes, y_codes = np.unique(y_fit, return_inverse=True)
+        knn = NearestNeighbors(n_neighbors=k_max, n_jobs=jobs).fit(X_fit)
+        neighbor_codes = y_codes[knn.kneighbors(scaler.transform(X[val_rows]), return_distance=False)]
+        # Classes the resampled fold no longer has get code -1 and are never predicted
+        truth = pd.Categorical(y.iloc[val_rows], categories=classes).codes
+
+        votes = np.zeros((len(val_rows), len(classes)), dtype=np.int32)
+        rows = np.arange(len(val_rows))
+        for k in range(k_max):
+            votes[rows, neighbor_codes[:, k]] += 1
+            scores[fold, k] = np.mean(votes.argmax(axis=1) == truth)
+    return scores
+
+
+def train(X, y, k_max=30, cv=5, jobs=-1, resample=True, seed=42):
+    X = X.to_numpy(dtype=np.float64)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, stratify=y, random_state=seed)
+
+    scores = tune_k(X_train, y_train, k_max, cv, jobs, resample, seed)
+    # First (smallest) k with the best mean score, as GridSearchCV picks
+    best_k = int(scores.mean(axis=0).argmax()) + 1
+    cv_scores = scores[:, best_k - 1]
+
+    scaler, X_fit, y_fit = fit_resampled(X_train, y_train, resample, smote_neighbors(y_train, cv), jobs, seed)
+    knn = KNeighborsClassifier(n_neighbors=best_k).fit(X_fit, y_fit)
+    # The scaler is saved with the model so the dashboard's raw inputs get the same scaling.
+    # The resampler only matters while fitting, so the dashboard never needs imblearn.
+    model = Pipeline([('scaler', scaler), ('knn', knn)])
+    y_pred = model.predict(X_test)
+
+    metrics = {
+        'best_k': best_k,
+        'accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
+        'recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
+        'f1': f1_score(y_test, y_pred, average='weighted', zero_division=0),
+        'cv_scores': cv_scores.tolist(),
+        'cv_mean': float(cv_scores.mean()),
+        'cv_std': float(cv_scores.std()),
+        'train_rows': len(y_train),
+        'test_rows': len(y_test),
+    }
+    return model, metrics
+
+
+def save_artifacts(output_dir, model, feature_columns, metrics, area_names, date_range):
+    """Writes every artifact to a temporary file first, then moves them all into place."""
+    os.makedirs(output_dir, exist_ok=True)
+    # Replaced in this order: the dashboard reloads when the model file changes, so it goes last
+    paths = {
+        'feature_columns': os.path.join(output_dir, 'feature_columns.pkl'),
+        'manifest': os.path.join(output_dir, 'model_manifest.json'),
+        'metrics': os.path.join(output_dir, 'metrics.json'),
+        'model': os.path.join(output_dir, 'knn_model.pkl'),
+    }
+    tmp = {name: path + '.tmp' for name, path in paths.items()}
+
+    # Refuse to publish a model the dashboard could not feed
+    check_schema(model, feature_columns)
+    # Uncompressed, so the dashboard can memory-map the arrays instead of copying them
+    joblib.dump(model, tmp['model'], compress=0)
+    joblib.dump(feature_columns, tmp['feature_columns'])
+    write_manifest(tmp['manifest'], feature_columns, model.classes_, area_names, date_range)
+    with open(tmp['metrics'], 'w') as f:
+        json.dump(metrics, f, indent=2)
+
+    for name, path in paths.items():
+        os.replace(tmp[name], path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the KNN crime category model from the local data store.')
+    parser.add_argument('--output-dir', default=MODELS_DIR)
+    parser.add_argument('--jobs', type=int, default=-1, help='worker processes (-1 = all cores)')
+    parser.add_argument('--sample', type=int, help='train on a random sample of this many records')
+    parser.add_argument('--since', help='only train on crimes that occurred on or after this date')
+    parser.add_argument('--until', help='only train on crimes that occurred on or before this date')
+    parser.add_argument('--k-max', type=int, default=30, help='largest n_neighbors tried')
+    parser.add_argument('--cv', type=int, default=5, help='cross-validation folds')
+    parser.add_argument('--no-resample', action='store_true', help='skip SMOTEENN')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data, date_range = load_training_data(args.sample, args.seed, args.since, args.until)
+    X, y = build_features(data)
+    model, metrics = train(X, y, k_max=args.k_max, cv=args.cv, jobs=args.jobs,
+                           resample=not args.no_resample, seed=args.seed)
+    metrics['training_date_range'] = [str(date.date()) for date in date_range]
+    metrics['seconds'] = round(time.perf_counter() - start, 1)
+
+    paths = save_artifacts(args.output_dir, model, X.columns.tolist(), metrics,
+                           data['AREA_NAME'].unique(), date_range)
+    print(f"Best k: {metrics['best_k']}  accuracy: {metrics['accuracy']:.4f}  "
+          f"cv: {metrics['cv_mean']:.4f} +/- {metrics['cv_std']:.4f}  ({metrics['seconds']}s)")
+    print(f"Saved {', '.join(paths.values())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+
+# ========================================================
+# VERSIONED INDEX FILES                                  |
+# ========================================================
+#
+# The spatial index and the time index are derived from the data store and
+# kept next to it as .npz files tagged with the store version they were built
+# from. A file written for another version is treated as missing, so the
+# index is rebuilt after any store change. Writes go through a temporary file
+# so readers never see a partial index.
+
+
+def save_arrays(path, version=None, **arrays):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, version=np.array(str(version)), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_arrays(path, version=None):
+    """The saved arrays as a dict, or None if the file is missing or was built for another store version."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as saved:
+        if version is not None and str(saved['version']) != str(version):
+            return None
+        return {name: saved[name] for name in saved.files if name != 'version'}
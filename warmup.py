@@ -0,0 +1,147 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import crime_predictor
+import crime_store
+import data_cache
+
+# ========================================================
+# STARTUP WARM-UP                                        |
+# ========================================================
+#
+# Everything a cold server has to build or load before it can draw a page is
+# started once per process on a thread pool: the Parquet store and count cube
+# (built from the CSV after a deploy), the spatial index, the model manifest
+# and the prediction table (rebuilt when the model changed). Independent
+# tasks run concurrently and dependent ones wait only for what they need.
+# Results go through the dashboard's own cached loaders (data_cache.py), so
+# the first session finds them in memory. The dashboard shows the readiness
+# state while this runs instead of making the first session build everything
+# inline.
+#
+# Sources are plain file paths, so the same warm-up runs offline against
+# local test files. It can also run ahead of the server in a deploy step:
+#
+#     python warmup.py && streamlit run dashboard.py
+#     python warmup.py --csv sample.csv --store /tmp/store/crime_data.parquet
+
+
+class Sources:
+
+    def __init__(self, csv_path=crime_store.CSV_PATH, store_path=crime_store.STORE_PATH,
+                 model_path=crime_predictor.MODEL_PATH, feature_columns_path=crime_predictor.FEATURE_COLUMNS_PATH,
+                 table_path=crime_predictor.TABLE_PATH, manifest_path=crime_predictor.MANIFEST_PATH):
+        self.csv_path = csv_path
+        self.store_path = store_path
+        self.model_path = model_path
+        self.feature_columns_path = feature_columns_path
+        self.table_path = table_path
+        self.manifest_path = manifest_path
+
+
+# What each dashboard page needs before it can render. The map's spatial index is
+# still warmed, but the Data page does not wait for it: the map panel starts collapsed.
+DATA_TASKS = ['store', 'crime_cube']
+MODEL_TASKS = ['manifest', 'prediction_table']
+
+
+def default_tasks(sources):
+    """{name: (function, [names it depends on])}, dependencies listed before their dependents."""
+    def store_version():
+        return crime_store.store_version(sources.store_path)
+
+    def model_version():
+        return crime_predictor.model_version(sources.model_path, sources.manifest_path)
+
+    return {
+        'store': (lambda: crime_store.ensure_store(sources.csv_path, sources.store_path), []),
+        'crime_cube': (lambda: data_cache.load_crime_cube(
+            store_version(), sources.csv_path, sources.store_path), ['store']),
+        'spatial_index': (lambda: data_cache.load_spatial_index(
+            store_version(), sources.csv_path, sources.store_path), ['store']),
+        'manifest': (lambda: data_cache.load_manifest(
+            model_version(), sources.manifest_path, sources.feature_columns_path), []),
+        'prediction_table': (lambda: data_cache.load_prediction_table(
+            model_version(), sources.model_path, sources.feature_columns_path, sources.table_path), []),
+    }
+
+
+class Warmup:
+
+    def __init__(self, tasks, max_workers=None):
+        self.tasks = tasks
+        self.state = {name: {'status': 'pending', 'seconds': None, 'error': None} for name in tasks}
+        self._futures = {}
+        # One worker per task, so a task waiting on its dependencies never starves them of a thread
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(tasks), thread_name_prefix='warmup')
+
+    def start(self):
+        for name in self.tasks:
+            self._futures[name] = self._executor.submit(self._run, name)
+        self._executor.shutdown(wait=False)
+        return self
+
+    def _run(self, name):
+        func, depends_on = self.tasks[name]
+        for dependency in depends_on:
+            self._futures[dependency].result()
+            if self.state[dependency]['status'] != 'ready':
+                self.state[name].update(status='failed', seconds=0.0, error=f'{dependency} failed')
+                return
+
+        self.state[name]['status'] = 'running'
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            self.state[name].update(status='failed', error=f'{type(e).__name__}: {e}')
+        else:
+            self.state[name]['status'] = 'ready'
+        finally:
+            self.state[name]['seconds'] = round(time.perf_counter() - start, 3)
+
+    def status(self):
+        return {name: dict(state) for name, state in self.state.items()}
+
+    def done(self, names=None):
+        """True once every named task (default: all) has finished, successfully or not."""
+        names = self.tasks if names is None else names
+        return all(self.state[name]['status'] in ('ready', 'failed') for name in names if name in self.state)
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for future in self._futures.values():
+            future.result(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return self.status()
+
+
+_warmup = None
+_lock = threading.Lock()
+
+
+def start(sources=None, tasks=None):
+    """Starts the process-wide warm-up the first time it is called; later calls return the same one."""
+    global _warmup
+    with _lock:
+        if _warmup is None:
+            _warmup = Warmup(tasks or default_tasks(sources or Sources())).start()
+    return _warmup
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and load everything the dashboard needs, concurrently.')
+    parser.add_argument('--csv', default=crime_store.CSV_PATH)
+    parser.add_argument('--store', default=crime_store.STORE_PATH)
+    parser.add_argument('--model', default=crime_predictor.MODEL_PATH)
+    parser.add_argument('--feature-columns', default=crime_predictor.FEATURE_COLUMNS_PATH)
+    parser.add_argument('--table', default=crime_predictor.TABLE_PATH)
+    parser.add_argument('--manifest', default=crime_predictor.MANIFEST_PATH)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    warmup = start(Sources(args.csv, args.store, args.model, args.feature_columns, args.table, args.manifest))
+    for name, state in warmup.wait().items():
+        print(f"{name:<18}{state['status']:<8}{state['seconds']:>8.2f}s  {state['error'] or ''}")
+    print(f'Warm-up finished in {time.perf_counter() - start_time:.2f}s')